@@ -2,7 +2,8 @@ from flask import Flask, request, abort
 import json
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from jwks import JWKSKeyStore
 
 
 app = Flask(__name__)
@@ -11,6 +12,9 @@ AUTH0_DOMAIN = @TODO_REPLACE_WITH_YOUR_DOMAIN
 ALGORITHMS = ['RS256']
 API_AUDIENCE = @TODO_REPLACE_WITH_YOUR_API_AUDIENCE
 
+# Signing keys of the tenant, cached by kid; see jwks.py.
+jwks = JWKSKeyStore(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
 
 class AuthError(Exception):
     def __init__(self, error, status_code):
@@ -52,25 +56,14 @@ def get_token_auth_header():
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = jwks.get(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
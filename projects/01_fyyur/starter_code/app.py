@@ -3,9 +3,11 @@
 #----------------------------------------------------------------------------#
 
 import json
+import functools
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
@@ -14,8 +16,14 @@ from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
 import sys
-from models import db, Artist, Venue, Show
-from sqlalchemy import func, cast
+import click
+from datetime import datetime, timedelta
+from models import db, Artist, Venue, Show, refresh_show_counts, rollover_show_counts
+from queries import venue_directory, venue_detail, artist_detail, shows_page, stream_shows, SHOWS_PER_PAGE
+from search import search, SEARCH_BACKENDS
+from cache import page_cache
+from importer import import_rows, read_rows, KINDS as IMPORT_KINDS
+import datagen
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -25,6 +33,7 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app)
+page_cache.init_app(app)
 
 
 migrate = Migrate(app,db)
@@ -33,16 +42,54 @@ migrate = Migrate(app,db)
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@functools.lru_cache(maxsize=None)
+def compile_datetime_format(format, locale):
+  return babel.dates.parse_pattern(format), babel.Locale.parse(locale)
+
+# Listings repeat the same start times over and over, so recently formatted
+# values are kept as well.
+@functools.lru_cache(maxsize=4096)
+def _format_datetime(date, format, locale):
+  pattern, locale = compile_datetime_format(format, locale)
+  return pattern.apply(date, locale)
+
+def format_datetime(value, format='medium', locale=babel.dates.LC_TIME):
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  return _format_datetime(value, DATETIME_FORMATS.get(format, format), locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Cache invalidation.
+#----------------------------------------------------------------------------#
+
+# Venue and artist names show up on each other's pages, so changing or
+# deleting one evicts the pages of everything it has played with. Evict only
+# once the change is committed; when deleting, collect the page tags first,
+# while the shows still exist.
+
+def venue_page_tags(venue_id):
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['venues', 'shows', 'venue:%s' % venue_id] + \
+         ['artist:%s' % artist_id for artist_id, in artist_ids]
+
+def artist_page_tags(artist_id):
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  return ['artists', 'shows', 'artist:%s' % artist_id] + \
+         ['venue:%s' % venue_id for venue_id, in venue_ids]
+
+def invalidate_venue_pages(venue_id):
+  page_cache.invalidate(*venue_page_tags(venue_id))
+
+def invalidate_artist_pages(artist_id):
+  page_cache.invalidate(*artist_page_tags(artist_id))
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -56,76 +103,24 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@page_cache.cached('venues')
 def venues():
-  locations = Venue.query.with_entities(Venue.city, Venue.state).group_by(Venue.city, Venue.state).all()
-
-  data = []
-
-  for location in locations:
-    result = {
-      "city": location.city,
-      "state": location.state,
-      "venues": []
-    }
-
-    venues=Venue.query.filter_by(city=location.city, state=location.state)
-    for venue in venues:
-      result['venues'].append({
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_shows": Show.query.filter(Show.venue_id == venue.id and Show.start_time > datetime.now()).count()
-      })
-    data.append(result)
-
-  return render_template('pages/venues.html', areas=data)
+  return render_template('pages/venues.html', areas=venue_directory())
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-  response={}
-  search_term= "%" + request.form.get('search_term') + "%"
-  venue_search = Venue.query.filter(Venue.name.ilike(search_term)).all()
-  data = []
-
-  for venue in venue_search:
-    venue_info = {}
-    venue_info['id'] = venue.id
-    venue_info['name'] = venue.name
-    data.append(venue_info)
-  
-  response['count'] = len(data)
-  response['data'] = data
-
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  search_term = request.form.get('search_term', '')
+  page = request.form.get('page', 1, type=int)
+  response = search(Venue, search_term, page)
+
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 @app.route('/venues/<int:venue_id>')
+@page_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
-
-  venue = Venue.query.get(venue_id)
-  shows = db.session.query(Artist, Show.start_time).join(Show).filter(Show.venue_id == venue_id)
-  past_shows_count = 0
-  upcoming_shows_count = 0
-  upcoming_shows = []
-  past_shows = []
-
-  for artist, start_time in shows:
-    show_info = {
-      'artist_id': artist.id,
-      'artist_name':artist.name,
-      'artist_image_link':artist.image_link,
-      'start_time': str(start_time)
-    }
-
-    if start_time < datetime.now():
-      past_shows.append(show_info)
-      past_shows_count += 1
-    else:
-      upcoming_shows.append(show_info)
-      upcoming_shows_count += 1
-    
-  setattr(venue, 'upcoming_shows', upcoming_shows)
-  setattr(venue, 'past_shows', past_shows)
-  setattr(venue, 'upcoming_shows_count', upcoming_shows_count)
-  setattr(venue, 'past_shows_count', past_shows_count)
+  venue = venue_detail(venue_id)
+  if venue is None:
+    abort(404)
 
   return render_template('pages/show_venue.html', venue=venue)
 
@@ -158,6 +153,7 @@ def create_venue_submission():
 
       db.session.add(venue)
       db.session.commit()
+      page_cache.invalidate('venues')
       flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except Exception as e:
       db.session.rollback()
@@ -176,8 +172,10 @@ def create_venue_submission():
 def delete_venue(venue_id):
   try:
     venue = Venue.query.get(venue_id)
+    tags = venue_page_tags(venue_id)
     db.session.delete(venue)
     db.session.commit()
+    page_cache.invalidate(*tags)
     flash('Venue deleted')
   except:
    db.session.rollback()
@@ -191,57 +189,25 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@page_cache.cached('artists')
 def artists():
   data = Artist.query.all()
   return render_template('pages/artists.html', artists=data)
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-  response={}
-  search_term= "%" + request.form.get('search_term') + "%"
-  artist_search = Artist.query.filter(Artist.name.ilike(search_term)).all()
-  data = []
-
-  for artist in artist_search:
-    artist_info = {}
-    artist_info['id'] = artist.id
-    artist_info['name'] = artist.name
-    data.append(artist_info)
-  
-  response['count'] = len(data)
-  response['data'] = data
-
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  search_term = request.form.get('search_term', '')
+  page = request.form.get('page', 1, type=int)
+  response = search(Artist, search_term, page)
+
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
+@page_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
-
-  artist = Artist.query.get(artist_id)
-  shows = db.session.query(Venue, Show.start_time).join(Show).filter(Show.artist_id == artist_id)
-  past_shows_count = 0
-  upcoming_shows_count = 0
-  upcoming_shows = []
-  past_shows = []
-
-  for venue, start_time in shows:
-    show_info = {
-      'venue_id': venue.id,
-      'venue_name':venue.name,
-      'venue_image_link':venue.image_link,
-      'start_time': str(start_time)
-    }
-
-    if start_time < datetime.now():
-      past_shows.append(show_info)
-      past_shows_count += 1
-    else:
-      upcoming_shows.append(show_info)
-      upcoming_shows_count += 1
-    
-  setattr(artist, 'upcoming_shows', upcoming_shows)
-  setattr(artist, 'past_shows', past_shows)
-  setattr(artist, 'upcoming_shows_count', upcoming_shows_count)
-  setattr(artist, 'past_shows_count', past_shows_count)
+  artist = artist_detail(artist_id)
+  if artist is None:
+    abort(404)
 
   return render_template('pages/show_artist.html', artist=artist)
 
@@ -261,17 +227,18 @@ def edit_artist_submission(artist_id):
 
   try:
     artist.name = form.name.data
-    artist.city = form.city.data,
-    artist.state = form.state.data,
-    artist.phone = form.phone.data,
-    artist.website = form.website.data,
-    artist.facebook_link = form.facebook_link.data,
-    artist.seeking_venue = form.seeking_venue.data,
-    artist.seeking_description = form.seeking_description.data,
+    artist.city = form.city.data
+    artist.state = form.state.data
+    artist.phone = form.phone.data
+    artist.website = form.website.data
+    artist.facebook_link = form.facebook_link.data
+    artist.seeking_venue = form.seeking_venue.data
+    artist.seeking_description = form.seeking_description.data
     artist.image_link = form.image_link.data
 
     db.session.add(artist)
-    db.commit()
+    db.session.commit()
+    invalidate_artist_pages(artist_id)
     flash('Artist updated')
   except:
     db.session.rollback()
@@ -293,18 +260,19 @@ def edit_venue_submission(venue_id):
 
   try:
     venue.name = form.name.data
-    venue.city = form.city.data,
-    venue.state = form.state.data,
-    venue.address = form.address.data,
-    venue.phone = form.phone.data,
-    venue.website = form.website.data,
-    venue.facebook_link = form.facebook_link.data,
-    venue.seeking_talent = form.seeking_venue.data,
-    venue.seeking_description = form.seeking_description.data,
+    venue.city = form.city.data
+    venue.state = form.state.data
+    venue.address = form.address.data
+    venue.phone = form.phone.data
+    venue.website = form.website.data
+    venue.facebook_link = form.facebook_link.data
+    venue.seeking_talent = form.seeking_talent.data
+    venue.seeking_description = form.seeking_description.data
     venue.image_link = form.image_link.data
 
     db.session.add(venue)
-    db.commit()
+    db.session.commit()
+    invalidate_venue_pages(venue_id)
     flash('Venue updated')
   except:
     db.session.rollback()
@@ -341,6 +309,7 @@ def create_artist_submission():
       )
       db.session.add(artist)
       db.session.commit()
+      page_cache.invalidate('artists')
       flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except Exception:
       db.session.rollback
@@ -359,15 +328,23 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@page_cache.cached('shows')
 def shows():
-  data=db.session.query(Show.venue_id.label('venue_id'),
-                        Venue.name.label('venue_name'), Show.artist_id, 
-                        Show.artist_id.label('artist_id'),
-                        Artist.name.label('artist_name'), 
-                        Artist.image_link.label('artist_image_link'), 
-                        cast(Show.start_time, db.String).label('start_time')).join(Venue).join(Artist).all()
+  if request.args.get('stream', 0, type=int):
+    # Render while reading: the template consumes the server-side cursor
+    # row by row as the response is sent.
+    context = {'shows': stream_shows(), 'next_cursor': None}
+    app.update_template_context(context)
+    template = app.jinja_env.get_template('pages/shows.html')
+    return Response(stream_with_context(template.generate(context)))
+
+  limit = request.args.get('limit', SHOWS_PER_PAGE, type=int)
+  try:
+    data, next_cursor = shows_page(request.args.get('after'), limit)
+  except ValueError:
+    abort(400)
 
-  return render_template('pages/shows.html', shows=data)
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
 
 @app.route('/shows/create')
 def create_shows():
@@ -389,6 +366,8 @@ def create_show_submission():
 
       db.session.add(show)
       db.session.commit()
+      page_cache.invalidate('shows', 'venues', 'venue:%s' % form.venue_id.data,
+                            'artist:%s' % form.artist_id.data)
       flash('A new show was successfully listed!')
     except Exception:
       db.session.rollback
@@ -402,6 +381,71 @@ def create_show_submission():
 
   return render_template('pages/home.html')
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('rollover-shows')
+@click.option('--minutes', default=60,
+              help='Shows that started this many minutes ago or later are moved to past.')
+@click.option('--full', is_flag=True,
+              help='Recompute every venue and artist counter from scratch.')
+def rollover_shows(minutes, full):
+  """Keeps the stored upcoming/past show counters current.
+
+  Meant to run from cron more often than --minutes, e.g. every 15 minutes
+  with the default 60 minute window.
+  """
+  if full:
+    refresh_show_counts(db.session.connection())
+  else:
+    rollover_show_counts(db.session.connection(), datetime.now() - timedelta(minutes=minutes))
+  db.session.commit()
+  page_cache.invalidate('venues')
+
+@app.cli.command('import-catalog')
+@click.argument('kind', type=click.Choice(sorted(IMPORT_KINDS)))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to csv for .csv files and ndjson otherwise.')
+@click.option('--chunk-size', default=5000, help='Rows per transaction.')
+@click.option('--rejects', type=click.File('w'),
+              help='Write rejected rows here as NDJSON, with their errors.')
+def import_catalog(kind, source, format, chunk_size, rejects):
+  """Bulk imports venues, artists or shows from a CSV or NDJSON file."""
+  if format is None:
+    format = 'csv' if source.name.endswith('.csv') else 'ndjson'
+
+  def on_reject(line_number, row, errors):
+    if rejects is not None:
+      rejects.write(json.dumps({'line': line_number, 'row': row, 'errors': errors}, default=str) + '\n')
+
+  report = import_rows(kind, read_rows(source, format), chunk_size, on_reject)
+  # The bulk insert skips the ORM events that keep these current.
+  page_cache.clear()
+  SEARCH_BACKENDS['memory'].invalidate()
+
+  click.echo('%d %s imported, %d rejected in %.1fs (%d rows/s)' % (
+    report.accepted, kind, report.rejected, report.seconds,
+    (report.accepted + report.rejected) / max(report.seconds, 1e-6)))
+
+@app.cli.command('generate-catalog')
+@click.option('--venues', default=1000)
+@click.option('--artists', default=2000)
+@click.option('--shows', default=20000)
+@click.option('--seed', default=0, help='Same seed, same catalog.')
+@click.option('--skew', default=1.1,
+              help='Zipf exponent of venue, artist, city and genre popularity; 0 is uniform.')
+@click.option('--cities', default=100)
+def generate_catalog(venues, artists, shows, seed, skew, cities):
+  """Adds a synthetic catalog of venues, artists and shows."""
+  catalog = datagen.generate(venues=venues, artists=artists, shows=shows,
+                             seed=seed, skew=skew, cities=cities)
+  datagen.load(catalog)
+  page_cache.clear()
+  SEARCH_BACKENDS['memory'].invalidate()
+  click.echo('%d venues, %d artists and %d shows generated' % (venues, artists, shows))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,306 @@
+'''
+Benchmarks for fyyur's read paths: how many queries the venue directory
+and detail pages run as the catalog grows, the datetime template filter,
+and the query plans of every listing route on a 200,000 show catalog.
+
+The catalogs are generated into the venue, artist and show tables of
+BENCH_DATABASE_URL, which end up dropped, so use a database of its own:
+
+    $ createdb fyyur_bench
+    $ python bench.py
+'''
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import babel.dates
+import dateutil.parser
+
+from app import app, format_datetime, _format_datetime, DATETIME_FORMATS
+from models import db, Venue, Artist, Show, refresh_show_counts
+from queries import venue_directory, encode_cursor
+from cache import page_cache
+
+BENCH_DATABASE_URL = os.environ.get(
+    'BENCH_DATABASE_URL', 'postgres://postgres@localhost:5432/fyyur_bench')
+
+app.config['SQLALCHEMY_DATABASE_URI'] = BENCH_DATABASE_URL
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Seattle', 'WA'), ('Chicago', 'IL')]
+
+
+@contextmanager
+def count_queries():
+    counter = {'count': 0, 'statements': []}
+
+    def on_execute(conn, cursor, statement, parameters, context, many):
+        counter['count'] += 1
+        counter['statements'].append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', on_execute)
+
+
+def seed(venues, shows_per_venue):
+    page_cache.clear()
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    now = datetime.now()
+    db.session.execute(Venue.__table__.insert(), [{
+        'id': i + 1,
+        'name': 'Venue %d' % i,
+        'city': CITIES[i % len(CITIES)][0],
+        'state': CITIES[i % len(CITIES)][1],
+        'address': '%d Main St' % i,
+        'genres': ['Jazz']
+    } for i in range(venues)])
+    db.session.execute(Artist.__table__.insert(), [{
+        'id': 1,
+        'name': 'Artist',
+        'city': 'San Francisco',
+        'state': 'CA',
+        'genres': ['Jazz']
+    }])
+    db.session.execute(Show.__table__.insert(), [{
+        'venue_id': i % venues + 1,
+        'artist_id': 1,
+        'start_time': now + timedelta(days=i - venues * shows_per_venue // 2)
+    } for i in range(venues * shows_per_venue)])
+    refresh_show_counts(db.session.connection())
+    db.session.commit()
+
+
+def bench_venue_directory(sizes=(10, 100, 1000), shows_per_venue=5):
+    '''
+    Renders /venues at growing venue counts. The query count must not grow
+    with the data.
+    '''
+    client = app.test_client()
+    counts = []
+
+    print('%8s %8s %10s' % ('venues', 'queries', 'ms'))
+    for size in sizes:
+        seed(size, shows_per_venue)
+
+        with count_queries() as counter:
+            start = time.perf_counter()
+            response = client.get('/venues')
+            elapsed = (time.perf_counter() - start) * 1000
+
+        assert response.status_code == 200
+        assert sum(len(area['venues']) for area in venue_directory()) == size
+        counts.append(counter['count'])
+        print('%8d %8d %10.2f' % (size, counter['count'], elapsed))
+
+    return len(set(counts)) == 1
+
+
+def bench_detail_pages(shows_per_venue=(1, 10, 100)):
+    '''
+    Renders a venue and an artist page with a growing number of shows. Each
+    must take exactly one query however many shows there are.
+    '''
+    client = app.test_client()
+    ok = True
+
+    print('%8s %10s %8s %10s' % ('shows', 'page', 'queries', 'ms'))
+    for size in shows_per_venue:
+        seed(10, size)
+
+        for url in ('/venues/1', '/artists/1'):
+            with count_queries() as counter:
+                start = time.perf_counter()
+                response = client.get(url)
+                elapsed = (time.perf_counter() - start) * 1000
+
+            assert response.status_code == 200
+            ok = ok and counter['count'] == 1
+            print('%8d %10s %8d %10.2f' % (size, url, counter['count'], elapsed))
+
+    return ok
+
+
+def bench_datetime_filter(rows=20000, distinct=500):
+    '''
+    Per-row cost of the datetime filter on a listing-sized page: the old
+    string round trip, the filter on datetimes with its memo cold, and warm.
+    '''
+    base = datetime(2026, 1, 1, 20, 0)
+    values = [base + timedelta(hours=i % distinct) for i in range(rows)]
+    strings = [str(value) for value in values]
+
+    def legacy(value):
+        return babel.dates.format_datetime(dateutil.parser.parse(value),
+                                           DATETIME_FORMATS['full'])
+
+    def run(label, f, inputs):
+        start = time.perf_counter()
+        for value in inputs:
+            f(value, 'full') if f is format_datetime else f(value)
+        per_row = (time.perf_counter() - start) / len(inputs) * 1e6
+        print('%-28s %10.2f us/row' % (label, per_row))
+
+    assert format_datetime(values[0], 'full') == legacy(strings[0])
+
+    run('string + parse + babel', legacy, strings)
+    _format_datetime.cache_clear()
+    run('datetime, memo cold', format_datetime, values[:distinct])
+    run('datetime, memo warm', format_datetime, values)
+    return True
+
+
+def seed_large(venues=20000, artists=20000, shows=200000):
+    '''
+    Seeds a production-sized dataset server side with generate_series and
+    refreshes the planner statistics.
+    '''
+    page_cache.clear()
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    db.session.execute(
+        "INSERT INTO venue (name, city, state, address, genres, search_text) "
+        "SELECT 'Venue ' || i, 'City ' || (i % 500), 'S' || (i % 50), i || ' Main St', "
+        "ARRAY['Jazz'], 'Venue ' || i || ' City ' || (i % 500) || ' Jazz' "
+        "FROM generate_series(1, :n) AS i", {'n': venues})
+    db.session.execute(
+        "INSERT INTO artist (name, city, state, genres, search_text) "
+        "SELECT 'Artist ' || i, 'City ' || (i % 500), 'S' || (i % 50), "
+        "ARRAY['Rock n Roll'], 'Artist ' || i || ' City ' || (i % 500) || ' Rock n Roll' "
+        "FROM generate_series(1, :n) AS i", {'n': artists})
+    db.session.execute(
+        "INSERT INTO show (venue_id, artist_id, start_time) "
+        "SELECT 1 + (i::bigint * 7919) % :venues, 1 + (i::bigint * 104729) % :artists, "
+        "now() + (i - :shows / 2) * interval '37 minutes' "
+        "FROM generate_series(1, :shows) AS i",
+        {'venues': venues, 'artists': artists, 'shows': shows})
+    # create_all() knows nothing of the search indexes the migrations add.
+    db.session.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venue', 'artist'):
+        db.session.execute(
+            'CREATE INDEX ix_{table}_search_text_trgm ON {table} '
+            'USING gin (search_text gin_trgm_ops)'.format(table=table))
+    db.session.commit()
+
+    connection = db.engine.raw_connection()
+    try:
+        connection.set_isolation_level(0)  # ANALYZE outside a transaction
+        connection.cursor().execute('ANALYZE')
+    finally:
+        connection.close()
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        for node in _plan_nodes(child):
+            yield node
+
+
+def explain(statement, parameters):
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+        return cursor.fetchone()[0][0]['Plan']
+    finally:
+        connection.close()
+
+
+# (url, form posted to it or None for a GET, tables the route may read in
+# full, row estimate budget for each statement). Only the listings that show
+# every venue/artist may scan; search has to go through the trigram index.
+PLAN_BUDGETS = [
+    ('/venues', None, {'venue'}, None),
+    ('/artists', None, {'artist'}, None),
+    ('/shows', None, set(), 100),
+    ('/shows?after={cursor}', None, set(), 100),
+    ('/venues/{venue_id}', None, set(), 1000),
+    ('/artists/{artist_id}', None, set(), 1000),
+    ('/venues/search', {'search_term': 'Venue 1234'}, set(), 1000),
+    ('/artists/search', {'search_term': 'Artist 1234'}, set(), 1000),
+]
+
+def bench_query_plans():
+    '''
+    EXPLAINs every statement each route runs against a large dataset and
+    fails on a sequential scan the route is not allowed, or on a row
+    estimate over its budget.
+    '''
+    seed_large()
+    show = db.session.query(Show).order_by(Show.start_time, Show.id).offset(1000).first()
+    ids = {
+        'cursor': encode_cursor(show.start_time, show.id),
+        'venue_id': show.venue_id,
+        'artist_id': show.artist_id,
+    }
+    db.session.remove()
+
+    client = app.test_client()
+    ok = True
+    for url, form, scannable, row_budget in PLAN_BUDGETS:
+        url = url.format(**ids)
+        with count_queries() as counter:
+            if form is None:
+                response = client.get(url)
+            else:
+                response = client.post(url, data=form)
+        assert response.status_code == 200
+
+        for statement, parameters in counter['statements']:
+            plan = explain(statement, parameters)
+            scans = {node['Relation Name'] for node in _plan_nodes(plan)
+                     if node['Node Type'] == 'Seq Scan'} - scannable
+            over_budget = row_budget is not None and plan['Plan Rows'] > row_budget
+
+            status = 'ok'
+            if scans:
+                status = 'SEQ SCAN on ' + ', '.join(sorted(scans))
+            elif over_budget:
+                status = 'estimates %d rows, budget %d' % (plan['Plan Rows'], row_budget)
+            ok = ok and status == 'ok'
+            print('%-40s %10d rows  %s' % (url[:40], plan['Plan Rows'], status))
+
+    return ok
+
+
+# Each check is a query count, plan or output comparison rather than a
+# timing, so a failure means a regression, not a slow machine.
+BENCHMARKS = {
+    'venues': (bench_venue_directory, '/venues query count grows with the number of venues'),
+    'detail': (bench_detail_pages, 'detail pages take more than one query'),
+    'filter': (bench_datetime_filter, 'datetime filter output changed'),
+    'plans': (bench_query_plans, 'a route query plan scans a table or goes over its row budget'),
+}
+
+
+if __name__ == '__main__':
+    # python bench.py [name ...] runs a subset, e.g. 'python bench.py filter'
+    # needs no database at all.
+    names = sys.argv[1:] or list(BENCHMARKS)
+    failures = []
+    with app.app_context():
+        for name in names:
+            bench, failure = BENCHMARKS[name]
+            print('\n# ' + name)
+            if not bench():
+                failures.append(failure)
+        db.session.remove()
+        if set(names) - {'filter'}:
+            db.drop_all()
+
+    for failure in failures:
+        print('FAIL: ' + failure)
+    if failures:
+        sys.exit(1)
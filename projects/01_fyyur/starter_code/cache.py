@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session
+
+'''
+Rendered page cache.
+
+Read-heavy pages are stored as rendered HTML under their URL, along with
+tags naming the records they show ('venues', 'venue:3', ...). Entries
+expire after RENDER_CACHE_TTL seconds, and the write handlers evict the
+tags they touch as soon as they commit.
+
+    @app.route('/venues/<int:venue_id>')
+    @page_cache.cached('venue:{venue_id}')
+    def show_venue(venue_id):
+        ...
+
+    page_cache.invalidate('venues', 'venue:3')
+'''
+
+
+class MemoryBackend(object):
+    '''
+    Per-process LRU dict, bounded to max_entries pages.
+    '''
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, page, tags)
+        self._tags = {}                # tag -> keys
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, page, ttl, tags=()):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.time() + ttl, page, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend(object):
+    '''
+    Shared between worker processes through any Redis-compatible server.
+    Pages are SETEX'd, tags are sets of page keys. The size bound is the
+    server's own maxmemory with an LRU eviction policy.
+    '''
+
+    def __init__(self, url, prefix='fyyur:page:'):
+        # Only this backend needs the redis client.
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        page = self._redis.get(self.prefix + key)
+        return page.decode('utf-8') if page is not None else None
+
+    def set(self, key, page, ttl, tags=()):
+        pipe = self._redis.pipeline()
+        pipe.setex(self.prefix + key, ttl, page)
+        for tag in tags:
+            pipe.sadd(self.prefix + 'tag:' + tag, self.prefix + key)
+            pipe.expire(self.prefix + 'tag:' + tag, ttl)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            keys = self._redis.smembers(tag_key)
+            self._redis.delete(tag_key, *keys)
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(self.prefix + '*'))
+        if keys:
+            self._redis.delete(*keys)
+
+
+class PageCache(object):
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RENDER_CACHE_BACKEND', 'memory')
+        app.config.setdefault('RENDER_CACHE_TTL', 60)
+        app.config.setdefault('RENDER_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('RENDER_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+        self.ttl = app.config['RENDER_CACHE_TTL']
+        backend = app.config['RENDER_CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config['RENDER_CACHE_MAX_ENTRIES'])
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['RENDER_CACHE_REDIS_URL'])
+        elif backend is None:
+            self.backend = None
+        else:
+            raise ValueError('unknown RENDER_CACHE_BACKEND: {!r}'.format(backend))
+
+    def cached(self, *tags):
+        '''
+        Caches the rendered page of a GET view. Tags are formatted with the
+        view arguments. Only rendered strings are stored, so streamed
+        responses, redirects and aborts pass straight through, and nothing
+        is cached or served while a flash message is waiting to be shown.
+        '''
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if self.backend is None or request.method != 'GET' or '_flashes' in session:
+                    return f(*args, **kwargs)
+
+                key = request.full_path
+                page = self.backend.get(key)
+                if page is not None:
+                    return page
+
+                rv = f(*args, **kwargs)
+                if isinstance(rv, str):
+                    self.backend.set(key, rv, self.ttl,
+                                     [tag.format(**kwargs) for tag in tags])
+                return rv
+
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        if self.backend is not None and tags:
+            self.backend.invalidate(tags)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+page_cache = PageCache()
@@ -11,3 +11,15 @@ DEBUG = True
 
 # TODO IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = 'postgres://postgres@localhost:5432/fyyur'
+
+# Search backend for /venues/search and /artists/search: 'postgres' or
+# 'memory'. Picked from the database dialect when unset.
+SEARCH_BACKEND = None
+SEARCH_RESULTS_PER_PAGE = 20
+
+# Rendered page cache: 'memory' (per process), 'redis' (shared, needs the
+# redis package) or None to turn it off.
+RENDER_CACHE_BACKEND = 'memory'
+RENDER_CACHE_TTL = 60
+RENDER_CACHE_MAX_ENTRIES = 1024
+RENDER_CACHE_REDIS_URL = 'redis://localhost:6379/0'
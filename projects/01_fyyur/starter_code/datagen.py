@@ -0,0 +1,184 @@
+import random
+from bisect import bisect
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import func
+
+from forms import VenueForm
+from models import db, Venue, Artist, Show, search_text_for, refresh_show_counts
+
+'''
+Deterministic synthetic catalogs.
+
+generate() builds venues, artists and shows from a seed: the same seed,
+sizes and now always give the same rows. Popularity follows a Zipf law
+with the given skew, so a few venues, artists, cities and genres get most
+of the shows, the way a real catalog does; skew=0 spreads them evenly.
+Every row passes the create forms, so a generated catalog can also be fed
+to import-catalog.
+
+    >>> catalog = generate(venues=1000, artists=2000, shows=20000, seed=7)
+    >>> load(catalog)
+
+    $ flask generate-catalog --venues 1000 --artists 2000 --shows 20000 --seed 7
+'''
+
+Catalog = namedtuple('Catalog', ['venues', 'artists', 'shows'])
+
+STATES = [value for value, label in VenueForm.state.kwargs['choices']]
+GENRES = [value for value, label in VenueForm.genres.kwargs['choices']]
+
+CITY_NAMES = ['Springfield', 'Riverside', 'Fairview', 'Franklin', 'Greenville',
+              'Bristol', 'Clinton', 'Salem', 'Madison', 'Georgetown', 'Arlington',
+              'Ashland', 'Dover', 'Oxford', 'Jackson', 'Burlington', 'Manchester',
+              'Milton', 'Newport', 'Auburn', 'Dayton', 'Lexington', 'Milford', 'Winchester']
+ADJECTIVES = ['Blue', 'Golden', 'Velvet', 'Electric', 'Midnight', 'Silver', 'Wild',
+              'Crimson', 'Hidden', 'Neon', 'Rusty', 'Lucky', 'Howling', 'Quiet']
+VENUE_NOUNS = ['Room', 'Hall', 'Lounge', 'Tavern', 'Club', 'Garden', 'Cellar',
+               'Theatre', 'Loft', 'Barn', 'Warehouse', 'Pavilion']
+ARTIST_NOUNS = ['Foxes', 'Static', 'Lanterns', 'Tides', 'Engines', 'Sparrows',
+                'Wolves', 'Satellites', 'Echoes', 'Rivers', 'Ghosts', 'Kings']
+
+
+class Popularity(object):
+    '''Draws indexes 0..n-1 with Zipf weights, rank order shuffled by rng.'''
+
+    def __init__(self, rng, n, skew):
+        ranks = list(range(n))
+        rng.shuffle(ranks)
+        self._items = ranks
+        self._cumulative = list(accumulate(1.0 / (rank + 1) ** skew for rank in range(n)))
+
+    def draw(self, rng):
+        index = bisect(self._cumulative, rng.random() * self._cumulative[-1])
+        return self._items[min(index, len(self._items) - 1)]
+
+
+def _cities(rng, count):
+    cities = []
+    for i in range(count):
+        name = CITY_NAMES[i % len(CITY_NAMES)]
+        if i >= len(CITY_NAMES):
+            name = '{} {}'.format(name, i // len(CITY_NAMES) + 1)
+        cities.append((name, rng.choice(STATES)))
+    return cities
+
+
+def _genres(rng, popularity):
+    return sorted({GENRES[popularity.draw(rng)] for _ in range(rng.randint(1, 3))})
+
+
+def _phone(rng):
+    return '{}-{}-{}'.format(rng.randint(200, 999), rng.randint(200, 999), rng.randint(1000, 9999))
+
+
+def generate(venues=1000, artists=2000, shows=20000, seed=0, skew=1.1,
+             cities=100, upcoming=0.5, days=365, now=None):
+    '''
+    Returns a Catalog of row dicts. Shows refer to venues and artists by
+    their position in the catalog (venue_index, artist_index); load() turns
+    those into ids. A share of upcoming shows start in the next days days,
+    the rest in the days before now.
+    '''
+    if now is None:
+        now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    rng = random.Random(seed)
+
+    places = _cities(rng, cities)
+    place_popularity = Popularity(rng, len(places), skew)
+    genre_popularity = Popularity(rng, len(GENRES), skew)
+
+    def profile(kind, i, nouns):
+        city, state = places[place_popularity.draw(rng)]
+        name = '{} {} {}'.format(rng.choice(ADJECTIVES), rng.choice(nouns), i + 1)
+        slug = name.lower().replace(' ', '-')
+        return {
+            'name': 'The ' + name if kind == 'venues' else name,
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'genres': _genres(rng, genre_popularity),
+            'seeking_description': None,
+            'image_link': 'https://images.example.com/{}/{}.jpg'.format(kind, i + 1),
+            'website': 'https://{}.example.com'.format(slug),
+            'facebook_link': 'https://www.facebook.com/{}'.format(slug),
+        }
+
+    venue_rows = []
+    for i in range(venues):
+        row = profile('venues', i, VENUE_NOUNS)
+        row['address'] = '{} {} St'.format(rng.randint(1, 9999), rng.choice(CITY_NAMES))
+        row['seeking_talent'] = rng.random() < 0.3
+        if row['seeking_talent']:
+            row['seeking_description'] = 'Looking for {} acts.'.format(row['genres'][0])
+        venue_rows.append(row)
+
+    artist_rows = []
+    for i in range(artists):
+        row = profile('artists', i, ARTIST_NOUNS)
+        row['seeking_venue'] = rng.random() < 0.3
+        if row['seeking_venue']:
+            row['seeking_description'] = 'Touring {} and nearby.'.format(row['city'])
+        artist_rows.append(row)
+
+    venue_popularity = Popularity(rng, venues, skew)
+    artist_popularity = Popularity(rng, artists, skew)
+    show_rows = []
+    for i in range(shows):
+        offset = timedelta(minutes=30 * rng.randint(1, days * 48))
+        show_rows.append({
+            'venue_index': venue_popularity.draw(rng),
+            'artist_index': artist_popularity.draw(rng),
+            'start_time': now + offset if rng.random() < upcoming else now - offset,
+        })
+
+    return Catalog(venue_rows, artist_rows, show_rows)
+
+
+def _next_id(connection, model):
+    return connection.scalar(db.select([func.coalesce(func.max(model.id), 0)])) + 1
+
+
+def _insert(connection, table, rows, chunk_size):
+    for start in range(0, len(rows), chunk_size):
+        connection.execute(table.insert(), rows[start:start + chunk_size])
+
+
+def load(catalog, chunk_size=5000):
+    '''
+    Inserts a catalog after whatever is already in the database, fills in
+    the stored show counters and commits. Returns the (first venue id,
+    first artist id) the catalog was given.
+    '''
+    connection = db.session.connection()
+    first_venue = _next_id(connection, Venue)
+    first_artist = _next_id(connection, Artist)
+
+    venues = [dict(row, id=first_venue + i,
+                   search_text=search_text_for(row['name'], row['city'], row['genres']))
+              for i, row in enumerate(catalog.venues)]
+    artists = [dict(row, id=first_artist + i,
+                    search_text=search_text_for(row['name'], row['city'], row['genres']))
+               for i, row in enumerate(catalog.artists)]
+    shows = [{'venue_id': first_venue + row['venue_index'],
+              'artist_id': first_artist + row['artist_index'],
+              'start_time': row['start_time']} for row in catalog.shows]
+
+    _insert(connection, Venue.__table__, venues, chunk_size)
+    _insert(connection, Artist.__table__, artists, chunk_size)
+    _insert(connection, Show.__table__, shows, chunk_size)
+
+    if connection.dialect.name == 'postgresql':
+        # Ids were given explicitly, move the sequences past them.
+        for table in ('venue', 'artist'):
+            connection.execute(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                "(SELECT max(id) FROM {0}))".format(table))
+
+    refresh_show_counts(connection,
+                        venue_ids=[row['id'] for row in venues],
+                        artist_ids=[row['id'] for row in artists])
+    db.session.commit()
+    return first_venue, first_artist
@@ -5,10 +5,10 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # fyyur has no unit tests; bench.py's checks fail on a broken route,
+    # an extra query or a changed template filter. Reseeds BENCH_DATABASE_URL.
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local("python bench.py", capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
@@ -39,9 +39,8 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    # The filter check is the only one that needs no scratch database.
+    local("heroku run python bench.py filter")
 
 
 def deploy():
@@ -56,3 +55,24 @@ def deploy():
 
 def rollback():
     local("heroku rollback")
+
+# benchmark
+
+
+def bench(baseline="bench_baseline.json", save=False, cache=False):
+    """fab bench compares a load test run against the stored baseline,
+    fab bench:save=yes records a new one. fab bench:cache=yes runs with the
+    page cache on, against its own baseline (bench_baseline_cached.json by
+    default). Reseeds BENCH_DATABASE_URL."""
+    options = ""
+    if cache:
+        options = " --cache"
+        if baseline == "bench_baseline.json":
+            baseline = "bench_baseline_cached.json"
+    if save:
+        local("python loadtest.py{} --output {}".format(options, baseline))
+        return
+    with settings(warn_only=True):
+        result = local("python loadtest.py{} --baseline {}".format(options, baseline))
+    if result.failed and not confirm("Performance regressed. Continue?"):
+        abort("Aborted at user request.")
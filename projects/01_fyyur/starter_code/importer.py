@@ -0,0 +1,254 @@
+import csv
+import io
+import json
+import time
+from collections import namedtuple
+from itertools import islice
+
+from werkzeug.datastructures import MultiDict
+
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, search_text_for, refresh_show_counts
+
+'''
+Bulk import of partner catalogs.
+
+Rows are streamed from a CSV or NDJSON file, checked chunk by chunk with the
+same form classes the create pages use, and each chunk of valid rows is
+written in its own transaction: COPY on PostgreSQL, executemany elsewhere.
+Shows may point at their artist and venue by id or by name; both are
+resolved against maps loaded once up front. Rejected rows are reported
+with their line number and the form errors.
+
+    $ flask import-catalog shows partner_shows.ndjson --rejects rejects.ndjson
+'''
+
+ImportReport = namedtuple('ImportReport', ['accepted', 'rejected', 'seconds'])
+
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+TRUE_VALUES = ('1', 'y', 'yes', 't', 'true', 'on')
+
+
+def read_rows(stream, format):
+    '''
+    Yields (line number, row dict) from a CSV or NDJSON stream; a line
+    that is not JSON gives None, which import_rows rejects.
+    '''
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'ndjson':
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError:
+                    yield line_number, None
+    else:
+        raise ValueError('unknown import format: {!r}'.format(format))
+
+
+def _formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres':
+            genres = value.split(',') if isinstance(value, str) else value
+            for genre in genres:
+                formdata.add('genres', genre.strip())
+        elif key in BOOLEAN_FIELDS:
+            if value is True or str(value).strip().lower() in TRUE_VALUES:
+                formdata.add(key, 'y')
+        else:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def _blank_to_none(value):
+    return None if value == '' else value
+
+
+class _Kind(object):
+    '''How one kind of record is validated and turned into table rows.'''
+
+    form = None
+    model = None
+    fields = ()
+
+    def prepare(self):
+        pass
+
+    def validate(self, row):
+        form = self.form(formdata=_formdata(row), meta={'csrf': False})
+        if not form.validate():
+            return None, form.errors
+        return {field: _blank_to_none(getattr(form, field).data) for field in self.fields}, None
+
+    def finish(self, connection):
+        pass
+
+
+class _VenueKind(_Kind):
+    form = VenueForm
+    model = Venue
+    fields = ('name', 'city', 'state', 'address', 'phone', 'genres',
+              'seeking_talent', 'seeking_description', 'image_link',
+              'website', 'facebook_link')
+
+    def validate(self, row):
+        values, errors = super(_VenueKind, self).validate(row)
+        if values is not None:
+            values['search_text'] = search_text_for(values['name'], values['city'], values['genres'])
+        return values, errors
+
+
+class _ArtistKind(_Kind):
+    form = ArtistForm
+    model = Artist
+    fields = ('name', 'city', 'state', 'phone', 'genres', 'seeking_venue',
+              'seeking_description', 'image_link', 'website', 'facebook_link')
+
+    def validate(self, row):
+        values, errors = super(_ArtistKind, self).validate(row)
+        if values is not None:
+            values['search_text'] = search_text_for(values['name'], values['city'], values['genres'])
+        return values, errors
+
+
+class _ShowKind(_Kind):
+    form = ShowForm
+    model = Show
+    fields = ('start_time',)
+
+    def prepare(self):
+        # id -> id and name -> id for every artist and venue, so resolving a
+        # show's foreign keys never goes back to the database.
+        self.artists = {}
+        self.venues = {}
+        for model, lookup in ((Artist, self.artists), (Venue, self.venues)):
+            for id, name in db.session.query(model.id, model.name):
+                lookup[str(id)] = id
+                lookup.setdefault(name, id)
+        self.venue_ids = set()
+        self.artist_ids = set()
+
+    def _resolve(self, row, kind, lookup, errors):
+        for key in (kind + '_id', kind + '_name'):
+            value = row.get(key)
+            if value not in (None, ''):
+                if str(value) in lookup:
+                    return lookup[str(value)]
+                errors[key] = ['Unknown {}: {}'.format(kind, value)]
+                return None
+        errors[kind + '_id'] = ['This field is required.']
+
+    def validate(self, row):
+        values, errors = super(_ShowKind, self).validate(row)
+        errors = errors or {}
+        if row.get('start_time') in (None, ''):
+            # ShowForm would fall back to its default of today.
+            errors['start_time'] = ['This field is required.']
+        artist_id = self._resolve(row, 'artist', self.artists, errors)
+        venue_id = self._resolve(row, 'venue', self.venues, errors)
+        if errors:
+            return None, errors
+
+        self.artist_ids.add(artist_id)
+        self.venue_ids.add(venue_id)
+        values['artist_id'] = artist_id
+        values['venue_id'] = venue_id
+        return values, None
+
+    def finish(self, connection):
+        # COPY and executemany skip the ORM events that keep the show
+        # counters current.
+        refresh_show_counts(connection, venue_ids=list(self.venue_ids),
+                            artist_ids=list(self.artist_ids))
+
+
+KINDS = {
+    'venues': _VenueKind,
+    'artists': _ArtistKind,
+    'shows': _ShowKind,
+}
+
+
+def _copy_value(value):
+    if isinstance(value, (list, tuple)):
+        return '{' + ','.join(
+            '"' + item.replace('\\', '\\\\').replace('"', '\\"') + '"' for item in value) + '}'
+    return value
+
+
+def _write(connection, table, rows):
+    if connection.dialect.name != 'postgresql':
+        connection.execute(table.insert(), rows)
+        return
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+
+    quote = connection.dialect.identifier_preparer.quote
+    cursor = connection.connection.cursor()
+    cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        quote(table.name), ', '.join(quote(column) for column in columns)), buffer)
+
+
+def import_rows(kind, rows, chunk_size=5000, on_reject=None):
+    '''
+    Imports (line number, row) pairs of the given kind ('venues', 'artists'
+    or 'shows'), committing every chunk_size rows. on_reject(line_number,
+    row, errors) is called for each invalid row, and for each row of a
+    chunk the database refused; that chunk is rolled back and the import
+    goes on with the next one.
+    '''
+    importer = KINDS[kind]()
+    table = importer.model.__table__
+    importer.prepare()
+
+    accepted = rejected = 0
+    start = time.perf_counter()
+    rows = iter(rows)
+
+    def reject(line_number, row, errors):
+        if on_reject is not None:
+            on_reject(line_number, row, errors)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        valid = []
+        for line_number, row in chunk:
+            if not isinstance(row, dict):
+                values, errors = None, {'row': ['not a JSON object']}
+            else:
+                values, errors = importer.validate(row)
+            if errors:
+                rejected += 1
+                reject(line_number, row, errors)
+            else:
+                valid.append((line_number, row, values))
+
+        if valid:
+            try:
+                _write(db.session.connection(), table, [values for _, _, values in valid])
+                db.session.commit()
+            except Exception as error:
+                db.session.rollback()
+                rejected += len(valid)
+                for line_number, row, _ in valid:
+                    reject(line_number, row, {'database': [str(error).splitlines()[0]]})
+                continue
+            accepted += len(valid)
+
+    importer.finish(db.session.connection())
+    db.session.commit()
+    return ImportReport(accepted, rejected, time.perf_counter() - start)
@@ -0,0 +1,293 @@
+'''
+Load test for fyyur's routes.
+
+Seeds BENCH_DATABASE_URL with a generated catalog (see datagen.py), then
+drives each route in turn and reports p50/p95/p99 latency, throughput,
+errors and queries per request. Like bench.py it drops and recreates the
+tables it runs against.
+
+    $ python loadtest.py --output bench_baseline.json    # store a baseline
+    $ python loadtest.py --baseline bench_baseline.json  # compare against it
+    $ python loadtest.py --server --concurrency 8        # through a local WSGI server
+    $ python loadtest.py --cache                          # with the page cache on
+
+The rendered page cache is off unless --cache is given: with it on, the
+repeated GETs of a route are served from memory and say nothing about the
+queries behind them. Cached and uncached runs are separate baselines.
+
+Requests go through the Flask test client by default. With --server they
+go over HTTP to a threaded werkzeug server in the same process, so queries
+are still counted. DELETE /venues/<id> is left out: it would eat the
+catalog under test.
+
+Comparing against a baseline fails when a route's p95 grows by more than
+--tolerance (and by more than a millisecond, to ignore timer noise), when
+it runs more queries per request, or when it starts returning errors.
+'''
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+
+from bench import count_queries
+from app import app
+from models import db
+from cache import page_cache
+import datagen
+
+app.config['WTF_CSRF_ENABLED'] = False
+# A broken route counts as an error instead of ending the run.
+app.config['PROPAGATE_EXCEPTIONS'] = False
+
+# method, path and form data are callables of a Scenario, so every request
+# can pick a different (popularity weighted) venue or artist. weight scales
+# the number of requests for routes that are too heavy to repeat as often.
+Route = namedtuple('Route', ['name', 'method', 'path', 'data', 'weight'])
+
+
+class Scenario(object):
+    '''Picks request arguments from the loaded catalog, deterministically.'''
+
+    def __init__(self, catalog, first_venue, first_artist, seed, skew):
+        self.catalog = catalog
+        self.first_venue = first_venue
+        self.first_artist = first_artist
+        self.rng = random.Random(seed)
+        self._venues = datagen.Popularity(self.rng, len(catalog.venues), skew)
+        self._artists = datagen.Popularity(self.rng, len(catalog.artists), skew)
+
+    def venue_id(self):
+        return self.first_venue + self._venues.draw(self.rng)
+
+    def artist_id(self):
+        return self.first_artist + self._artists.draw(self.rng)
+
+    def search_term(self, rows):
+        row = self.rng.choice(rows)
+        return self.rng.choice([row['city'], row['genres'][0], row['name'].split()[-2]])
+
+    def venue_form(self):
+        return self._form(self.rng.choice(self.catalog.venues))
+
+    def artist_form(self):
+        return self._form(self.rng.choice(self.catalog.artists))
+
+    def show_form(self):
+        return {'venue_id': self.venue_id(), 'artist_id': self.artist_id(),
+                'start_time': '2030-01-01 20:00:00'}
+
+    @staticmethod
+    def _form(row):
+        form = {key: value for key, value in row.items()
+                if value not in (None, False) and key != 'genres'}
+        form['genres'] = row['genres']
+        for key in ('seeking_talent', 'seeking_venue'):
+            if form.get(key):
+                form[key] = 'y'
+        return form
+
+
+def _get(path):
+    return Route(path, 'GET', lambda s: path, None, 1.0)
+
+
+ROUTES = [
+    _get('/'),
+    _get('/venues'),
+    Route('/venues/search', 'POST', lambda s: '/venues/search',
+          lambda s: {'search_term': s.search_term(s.catalog.venues)}, 1.0),
+    Route('/venues/<id>', 'GET', lambda s: '/venues/%d' % s.venue_id(), None, 1.0),
+    _get('/venues/create'),
+    Route('/venues/create', 'POST', lambda s: '/venues/create', lambda s: s.venue_form(), 0.2),
+    Route('/venues/<id>/edit', 'GET', lambda s: '/venues/%d/edit' % s.venue_id(), None, 1.0),
+    Route('/venues/<id>/edit', 'POST', lambda s: '/venues/%d/edit' % s.venue_id(),
+          lambda s: s.venue_form(), 0.2),
+    _get('/artists'),
+    Route('/artists/search', 'POST', lambda s: '/artists/search',
+          lambda s: {'search_term': s.search_term(s.catalog.artists)}, 1.0),
+    Route('/artists/<id>', 'GET', lambda s: '/artists/%d' % s.artist_id(), None, 1.0),
+    _get('/artists/create'),
+    Route('/artists/create', 'POST', lambda s: '/artists/create', lambda s: s.artist_form(), 0.2),
+    Route('/artists/<id>/edit', 'GET', lambda s: '/artists/%d/edit' % s.artist_id(), None, 1.0),
+    Route('/artists/<id>/edit', 'POST', lambda s: '/artists/%d/edit' % s.artist_id(),
+          lambda s: s.artist_form(), 0.2),
+    _get('/shows'),
+    Route('/shows?stream=1', 'GET', lambda s: '/shows?stream=1', None, 0.05),
+    _get('/shows/create'),
+    Route('/shows/create', 'POST', lambda s: '/shows/create', lambda s: s.show_form(), 0.2),
+]
+
+
+class TestClientDriver(object):
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def __call__(self, method, path, data):
+        response = self.client.open(path, method=method, data=data)
+        response.get_data()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class ServerDriver(object):
+
+    def __init__(self):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.base = 'http://127.0.0.1:%d' % self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def __call__(self, method, path, data):
+        body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        request = urllib.request.Request(self.base + path, data=body, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def close(self):
+        self.server.shutdown()
+
+
+def percentile(sorted_values, fraction):
+    '''Nearest-rank percentile of an already sorted list.'''
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_route(driver, scenario, route, requests, concurrency):
+    calls = [(route.method, route.path(scenario), route.data(scenario) if route.data else None)
+             for _ in range(max(1, int(requests * route.weight)))]
+    driver(*calls[0])  # warm up
+
+    def timed(call):
+        start = time.perf_counter()
+        status = driver(*call)
+        return time.perf_counter() - start, status
+
+    with count_queries() as counter:
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as pool:
+                results = list(pool.map(timed, calls))
+        else:
+            results = [timed(call) for call in calls]
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency * 1000 for latency, status in results)
+    return {
+        'requests': len(calls),
+        'errors': sum(status >= 500 for latency, status in results),
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'rps': len(calls) / elapsed,
+        'queries': counter['count'] / len(calls),
+    }
+
+
+def compare(results, baseline, tolerance):
+    '''Returns a list of regression messages, empty when there are none.'''
+    regressions = []
+    for name, stats in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            continue
+        if stats['p95_ms'] > before['p95_ms'] * (1 + tolerance) and \
+                stats['p95_ms'] - before['p95_ms'] > 1:
+            regressions.append('%s p95 %.2fms -> %.2fms' % (name, before['p95_ms'], stats['p95_ms']))
+        if stats['queries'] > before['queries'] + 0.5:
+            regressions.append('%s queries/request %.1f -> %.1f' % (name, before['queries'], stats['queries']))
+        if stats['errors'] and not before['errors']:
+            regressions.append('%s now fails %d of %d requests' % (name, stats['errors'], stats['requests']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+    parser.add_argument('--server', action='store_true', help='Go through a local WSGI server.')
+    parser.add_argument('--concurrency', type=int, default=1, help='Client threads, with --server.')
+    parser.add_argument('--cache', action='store_true', help='Keep the rendered page cache on.')
+    parser.add_argument('--output', help='Write the results here as JSON.')
+    parser.add_argument('--baseline', help='Compare against results stored with --output.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p95 growth over the baseline, as a fraction.')
+    args = parser.parse_args(argv)
+
+    if args.concurrency > 1 and not args.server:
+        parser.error('--concurrency needs --server')
+
+    with app.app_context():
+        page_cache.clear()
+        if not args.cache:
+            page_cache.backend = None
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        catalog = datagen.generate(venues=args.venues, artists=args.artists, shows=args.shows,
+                                   seed=args.seed, skew=args.skew)
+        first_venue, first_artist = datagen.load(catalog)
+        db.session.remove()
+        scenario = Scenario(catalog, first_venue, first_artist, args.seed, args.skew)
+
+        driver = ServerDriver() if args.server else TestClientDriver()
+        routes = {}
+        print('%-22s %6s %6s %9s %9s %9s %9s %8s' % (
+            'route', 'method', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries'))
+        try:
+            for route in ROUTES:
+                stats = run_route(driver, scenario, route, args.requests, args.concurrency)
+                routes['%s %s' % (route.method, route.name)] = stats
+                print('%-22s %6s %6d %9.2f %9.2f %9.2f %9.1f %8.1f' % (
+                    route.name, route.method, stats['errors'], stats['p50_ms'],
+                    stats['p95_ms'], stats['p99_ms'], stats['rps'], stats['queries']))
+        finally:
+            driver.close()
+            db.session.remove()
+            db.drop_all()
+
+    results = {
+        'settings': {key: value for key, value in vars(args).items()
+                     if key not in ('output', 'baseline', 'tolerance')},
+        'routes': routes,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != results['settings']:
+            print('WARNING: baseline was recorded with different settings: %s' % baseline['settings'])
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""show counters on venue and artist
+
+Revision ID: 3f2a9c1d7b4e
+Revises: eb9d8026e4aa
+Create Date: 2026-10-18 09:12:40.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b4e'
+down_revision = 'eb9d8026e4aa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill from the show table
+    for table in ('venue', 'artist'):
+        op.execute(
+            'UPDATE {table} SET '
+            'upcoming_shows_count = (SELECT count(show.id) FROM show '
+            'WHERE show.{table}_id = {table}.id AND show.start_time > now()), '
+            'past_shows_count = (SELECT count(show.id) FROM show '
+            'WHERE show.{table}_id = {table}.id AND show.start_time <= now())'
+            .format(table=table)
+        )
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,37 @@
+"""search text with trigram index
+
+Revision ID: 8b41d6e2a9f3
+Revises: 3f2a9c1d7b4e
+Create Date: 2026-10-18 11:40:03.561902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41d6e2a9f3'
+down_revision = '3f2a9c1d7b4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('search_text', sa.Text(), nullable=True))
+        op.execute(
+            "UPDATE {table} SET search_text = concat_ws(' ', name, city, "
+            "array_to_string(genres, ' '))".format(table=table)
+        )
+        op.execute(
+            'CREATE INDEX ix_{table}_search_text_trgm ON {table} '
+            'USING gin (search_text gin_trgm_ops)'.format(table=table)
+        )
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index('ix_{}_search_text_trgm'.format(table), table_name=table)
+        op.drop_column(table, 'search_text')
@@ -0,0 +1,30 @@
+"""indexes for show lookups and venue areas
+
+Revision ID: a6c3e8f1d205
+Revises: 8b41d6e2a9f3
+Create Date: 2026-10-18 14:02:51.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c3e8f1d205'
+down_revision = '8b41d6e2a9f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'], unique=False)
+    op.create_index('ix_venue_state_city', 'venue', ['state', 'city'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venue_state_city', table_name='venue')
+    op.drop_index('ix_show_start_time_id', table_name='show')
+    op.drop_index('ix_show_artist_id_start_time', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='show')
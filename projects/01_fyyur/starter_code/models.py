@@ -1,6 +1,7 @@
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
 import datetime
 
 
@@ -8,6 +9,9 @@ db = SQLAlchemy()
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_state_city', 'state', 'city'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -21,6 +25,9 @@ class Venue(db.Model):
     seeking_description = db.Column(db.String(500))
     genres = db.Column(db.ARRAY(db.String(120)))
     website = db.Column(db.String(500))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    search_text = db.Column(db.Text)
     shows = db.relationship('Show', backref='venue', lazy=True, passive_deletes=True)
 
 class Artist(db.Model):
@@ -38,12 +45,174 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
     genres = db.Column(db.ARRAY(db.String(120)))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    search_text = db.Column(db.Text)
     shows = db.relationship('Show', backref='artist', lazy=True, passive_deletes=True)
 
 class Show(db.Model):
     __tablename__ = 'show'
+    __table_args__ = (
+        # venue and artist pages, show counters
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        # /shows keyset pagination, counter rollover
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete="CASCADE"))
-    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete="CASCADE"))
\ No newline at end of file
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete="CASCADE"))
+
+#----------------------------------------------------------------------------#
+# Search text.
+#----------------------------------------------------------------------------#
+
+# name, city and genres folded into one column, which carries the pg_trgm GIN
+# index the search endpoints filter on (see search.py). Ranking runs
+# to_tsvector over the matched rows only, so there is no full-text index.
+
+def search_text_for(name, city, genres):
+    parts = [name, city] + list(genres or [])
+    return ' '.join(part for part in parts if isinstance(part, str))
+
+
+def _set_search_text(mapper, connection, target):
+    target.search_text = search_text_for(target.name, target.city, target.genres)
+
+
+for _model in (Venue, Artist):
+    event.listen(_model, 'before_insert', _set_search_text)
+    event.listen(_model, 'before_update', _set_search_text)
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist keep their upcoming/past show counts in columns so pages
+# never have to scan the show table. Inserting a show bumps the counter its
+# start time picks, in the same flush. Deleting a show, or changing its start
+# time, venue or artist, recomputes the counters of every venue and artist
+# involved with refresh_show_counts(): whether a show that has started was
+# still counted as upcoming depends on when the rollover job last ran, so the
+# bucket it has to leave cannot be guessed. refresh_show_counts() is also
+# what the rollover job runs as shows move into the past.
+
+@event.listens_for(Show, 'after_insert')
+def _count_inserted_show(mapper, connection, show):
+    if show.start_time > datetime.datetime.now():
+        column = 'upcoming_shows_count'
+    else:
+        column = 'past_shows_count'
+
+    for table, owner_id in ((Venue.__table__, show.venue_id),
+                            (Artist.__table__, show.artist_id)):
+        if owner_id is not None:
+            connection.execute(table.update()
+                               .where(table.c.id == owner_id)
+                               .values({column: table.c[column] + 1}))
+
+
+def _refresh_show_owners(connection, venue_ids, artist_ids):
+    venue_ids = [id for id in set(venue_ids) if id is not None]
+    artist_ids = [id for id in set(artist_ids) if id is not None]
+    if venue_ids or artist_ids:
+        refresh_show_counts(connection, venue_ids=venue_ids, artist_ids=artist_ids)
+
+
+@event.listens_for(Show, 'after_delete')
+def _count_deleted_show(mapper, connection, show):
+    _refresh_show_owners(connection, [show.venue_id], [show.artist_id])
+
+
+@event.listens_for(Show, 'after_update')
+def _count_updated_show(mapper, connection, show):
+    attrs = inspect(show).attrs
+    if not any(attrs[name].history.has_changes()
+               for name in ('start_time', 'venue_id', 'artist_id')):
+        return
+    # The old ids lose the show, the current ones gain it.
+    _refresh_show_owners(
+        connection,
+        list(attrs.venue_id.history.deleted) + [show.venue_id],
+        list(attrs.artist_id.history.deleted) + [show.artist_id])
+
+
+@event.listens_for(Venue, 'before_delete')
+def _collect_venue_artists(mapper, connection, venue):
+    # The venue's shows go away through ON DELETE CASCADE, without any
+    # Show event firing, so the artists that played there are refreshed
+    # once the venue row is gone.
+    show = Show.__table__
+    venue._cascaded_artist_ids = [row[0] for row in connection.execute(
+        db.select([show.c.artist_id]).where(show.c.venue_id == venue.id).distinct())]
+
+
+@event.listens_for(Venue, 'after_delete')
+def _refresh_venue_artists(mapper, connection, venue):
+    if venue._cascaded_artist_ids:
+        refresh_show_counts(connection, artist_ids=venue._cascaded_artist_ids)
+
+
+@event.listens_for(Artist, 'before_delete')
+def _collect_artist_venues(mapper, connection, artist):
+    show = Show.__table__
+    artist._cascaded_venue_ids = [row[0] for row in connection.execute(
+        db.select([show.c.venue_id]).where(show.c.artist_id == artist.id).distinct())]
+
+
+@event.listens_for(Artist, 'after_delete')
+def _refresh_artist_venues(mapper, connection, artist):
+    if artist._cascaded_venue_ids:
+        refresh_show_counts(connection, venue_ids=artist._cascaded_venue_ids)
+
+
+def _show_count(owner, foreign_key, condition):
+    show = Show.__table__
+    return db.select([db.func.count(show.c.id)])\
+        .where(foreign_key == owner.c.id)\
+        .where(condition)\
+        .as_scalar()
+
+
+def refresh_show_counts(connection, venue_ids=None, artist_ids=None, now=None):
+    '''
+    Recomputes the stored show counters from the show table. With no ids at
+    all every venue and artist is refreshed.
+    '''
+    if now is None:
+        now = datetime.datetime.now()
+
+    show = Show.__table__
+    everything = venue_ids is None and artist_ids is None
+    targets = ((Venue.__table__, show.c.venue_id, venue_ids),
+               (Artist.__table__, show.c.artist_id, artist_ids))
+
+    for owner, foreign_key, ids in targets:
+        if ids is None and not everything:
+            continue
+
+        statement = owner.update().values(
+            upcoming_shows_count=_show_count(owner, foreign_key, show.c.start_time > now),
+            past_shows_count=_show_count(owner, foreign_key, show.c.start_time <= now))
+        if ids is not None:
+            statement = statement.where(owner.c.id.in_(ids))
+        connection.execute(statement)
+
+
+def rollover_show_counts(connection, since, now=None):
+    '''
+    Moves shows that started in (since, now] from the upcoming counters to
+    the past ones, touching only the venues and artists that played them.
+    '''
+    if now is None:
+        now = datetime.datetime.now()
+
+    show = Show.__table__
+    started = db.and_(show.c.start_time > since, show.c.start_time <= now)
+    refresh_show_counts(
+        connection,
+        venue_ids=db.select([show.c.venue_id]).where(started),
+        artist_ids=db.select([show.c.artist_id]).where(started),
+        now=now)
@@ -0,0 +1,184 @@
+import base64
+import binascii
+from collections import namedtuple
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import configure_mappers, contains_eager
+
+from models import db, Venue, Artist, Show
+
+SHOWS_PER_PAGE = 30
+MAX_SHOWS_PER_PAGE = 200
+
+'''
+venue_directory()
+    builds the city/state -> venues -> upcoming show count tree used by
+    /venues from a single statement over the venue table, reading the
+    stored upcoming show counter
+'''
+
+
+def venue_directory():
+    rows = db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_shows_count.label('num_upcoming_shows')
+    ).order_by(Venue.state, Venue.city, Venue.id).all()
+
+    areas = []
+    for (city, state), venues in groupby(rows, lambda row: (row.city, row.state)):
+        areas.append({
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': venue.id,
+                'name': venue.name,
+                'num_upcoming_shows': venue.num_upcoming_shows
+            } for venue in venues]
+        })
+
+    return areas
+
+
+'''
+Show listing
+    /shows is read in (start_time, id) order. Pages are fetched with a seek
+    condition on that pair rather than an OFFSET, and the position of the
+    last row travels in the URL as an opaque cursor token.
+'''
+
+
+def _show_listing():
+    return db.session.query(
+        Show.id,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join(Venue).join(Artist).order_by(Show.start_time, Show.id)
+
+
+def encode_cursor(start_time, show_id):
+    position = '{}|{}'.format(start_time.isoformat(), show_id)
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    '''
+    The (start_time, show id) of the last show on the previous /shows page.
+    ValueError for anything encode_cursor did not produce.
+    '''
+    try:
+        position = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        start_time, show_id = position.split('|')
+        return datetime.fromisoformat(start_time), int(show_id)
+    except (TypeError, UnicodeDecodeError, binascii.Error):
+        raise ValueError('invalid cursor: {!r}'.format(token))
+
+
+def shows_page(after=None, limit=SHOWS_PER_PAGE):
+    '''
+    Returns up to limit shows following the after cursor, and the cursor of
+    the next page (None on the last one).
+    '''
+    limit = max(1, min(limit, MAX_SHOWS_PER_PAGE))
+    query = _show_listing()
+    if after:
+        start_time, show_id = decode_cursor(after)
+        query = query.filter(tuple_(Show.start_time, Show.id) > tuple_(start_time, show_id))
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.start_time, last.id)
+
+
+def stream_shows(batch_size=500):
+    '''
+    Iterates every show from a server-side cursor, batch_size rows at a
+    time, so the full listing is never held in memory.
+    '''
+    return _show_listing().yield_per(batch_size)
+
+
+'''
+Detail pages
+    venue_detail() and artist_detail() load the entity, its shows and the
+    artist/venue of each show in one outer-joined statement, split the shows
+    against a single now, and hand back read-only views for the templates
+    instead of decorating the ORM instance.
+'''
+
+_SHOW_FIELDS = ['upcoming_shows', 'past_shows', 'upcoming_shows_count', 'past_shows_count']
+
+VenueView = namedtuple('VenueView', [
+    'id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+    'facebook_link', 'seeking_talent', 'seeking_description', 'image_link'
+] + _SHOW_FIELDS)
+
+ArtistView = namedtuple('ArtistView', [
+    'id', 'name', 'genres', 'city', 'state', 'phone', 'website',
+    'facebook_link', 'seeking_venue', 'seeking_description', 'image_link'
+] + _SHOW_FIELDS)
+
+VenueShowView = namedtuple('VenueShowView', [
+    'artist_id', 'artist_name', 'artist_image_link', 'start_time'])
+
+ArtistShowView = namedtuple('ArtistShowView', [
+    'venue_id', 'venue_name', 'venue_image_link', 'start_time'])
+
+
+def _counterpart(show, other):
+    counterpart = getattr(show, other)
+    return counterpart.id, counterpart.name, counterpart.image_link
+
+
+def _load_detail(model, other, entity_id, view, show_view, now):
+    # Show.venue and Show.artist are backrefs, they only exist once the
+    # mappers are configured.
+    configure_mappers()
+    shows = model.shows
+    counterpart = getattr(Show, other)
+
+    entity = db.session.query(model)\
+        .outerjoin(shows)\
+        .outerjoin(counterpart)\
+        .options(contains_eager(shows).contains_eager(counterpart))\
+        .filter(model.id == entity_id)\
+        .order_by(Show.start_time, Show.id)\
+        .one_or_none()
+    if entity is None:
+        return None
+
+    if now is None:
+        now = datetime.now()
+
+    upcoming_shows = []
+    past_shows = []
+    for show in entity.shows:
+        target = upcoming_shows if show.start_time > now else past_shows
+        target.append(show_view(*_counterpart(show, other), show.start_time))
+
+    fields = {field: getattr(entity, field) for field in view._fields
+              if field not in _SHOW_FIELDS}
+    return view(upcoming_shows=tuple(upcoming_shows),
+                past_shows=tuple(past_shows),
+                upcoming_shows_count=len(upcoming_shows),
+                past_shows_count=len(past_shows),
+                **fields)
+
+
+def venue_detail(venue_id, now=None):
+    return _load_detail(Venue, 'artist', venue_id, VenueView, VenueShowView, now)
+
+
+def artist_detail(artist_id, now=None):
+    return _load_detail(Artist, 'venue', artist_id, ArtistView, ArtistShowView, now)
@@ -0,0 +1,149 @@
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event, func
+
+from models import db, Venue, Artist
+
+SEARCH_RESULTS_PER_PAGE = 20
+
+'''
+search(model, term, page=1, per_page=None)
+    case-insensitive partial match of term against the name, city and
+    genres of venues or artists (their search_text column), best matches
+    first, one page at a time
+
+    PostgreSQL databases, with the pg_trgm migration applied, search in
+    SQL; any other database gets the in-process trigram index. Setting
+    SEARCH_BACKEND to 'postgres' or 'memory' forces one of them
+'''
+
+
+def search(model, term, page=1, per_page=None):
+    if per_page is None:
+        per_page = current_app.config.get('SEARCH_RESULTS_PER_PAGE', SEARCH_RESULTS_PER_PAGE)
+    page = max(page, 1)
+
+    count, rows = get_search_backend().search(model, term.strip(), page, per_page)
+    return {
+        'count': count,
+        'page': page,
+        'pages': (count + per_page - 1) // per_page,
+        'data': [{
+            'id': row.id,
+            'name': row.name,
+            'num_upcoming_shows': row.upcoming_shows_count
+        } for row in rows]
+    }
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class PostgresSearch(object):
+    '''
+    Ranked search in a single statement. The ILIKE filter is served by the
+    pg_trgm GIN index on search_text, matches are ranked on whole words
+    first, then on name prefix, and the total comes back with the page
+    through a window count.
+    '''
+
+    def search(self, model, term, page, per_page):
+        pattern = _escape_like(term)
+        document = func.to_tsvector('simple', model.search_text)
+        query = func.plainto_tsquery('simple', term)
+
+        rows = db.session.query(
+            model.id,
+            model.name,
+            model.upcoming_shows_count,
+            func.count().over().label('total')
+        ).filter(model.search_text.ilike('%' + pattern + '%', escape='\\'))\
+            .order_by(func.ts_rank(document, query).desc(),
+                      model.name.ilike(pattern + '%', escape='\\').desc(),
+                      model.name,
+                      model.id)\
+            .limit(per_page)\
+            .offset((page - 1) * per_page)\
+            .all()
+
+        return (rows[0].total if rows else 0), rows
+
+
+class InMemorySearch(object):
+    '''
+    Trigram inverted index kept in process, for databases without pg_trgm
+    such as the SQLite test runs. Indexes are built on first use and thrown
+    away whenever a venue or artist is written.
+    '''
+
+    def __init__(self):
+        self._indexes = {}
+
+    def invalidate(self, model=None):
+        if model is None:
+            self._indexes.clear()
+        else:
+            self._indexes.pop(model, None)
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _index(self, model):
+        if model not in self._indexes:
+            documents = {}
+            postings = defaultdict(set)
+            for id, name, text in db.session.query(model.id, model.name, model.search_text):
+                text = (text or name).lower()
+                documents[id] = (name.lower(), text, set(text.split()))
+                for trigram in self._trigrams(text):
+                    postings[trigram].add(id)
+            self._indexes[model] = (documents, postings)
+        return self._indexes[model]
+
+    def search(self, model, term, page, per_page):
+        documents, postings = self._index(model)
+        term = term.lower()
+
+        trigrams = self._trigrams(term)
+        if trigrams:
+            candidates = set.intersection(*(postings.get(t, set()) for t in trigrams))
+        else:
+            candidates = documents.keys()
+
+        words = term.split()
+        matches = sorted(
+            (id for id in candidates if term in documents[id][1]),
+            key=lambda id: (-sum(word in documents[id][2] for word in words),
+                            not documents[id][0].startswith(term),
+                            documents[id][0],
+                            id))
+
+        page_ids = matches[(page - 1) * per_page:page * per_page]
+        rows = {row.id: row for row in db.session.query(
+            model.id, model.name, model.upcoming_shows_count).filter(model.id.in_(page_ids))}
+        return len(matches), [rows[id] for id in page_ids if id in rows]
+
+
+SEARCH_BACKENDS = {
+    'postgres': PostgresSearch(),
+    'memory': InMemorySearch()
+}
+
+
+def get_search_backend():
+    name = current_app.config.get('SEARCH_BACKEND')
+    if name is None:
+        name = 'postgres' if db.engine.dialect.name == 'postgresql' else 'memory'
+    return SEARCH_BACKENDS[name]
+
+
+def _invalidate_memory_index(mapper, connection, target):
+    SEARCH_BACKENDS['memory'].invalidate(mapper.class_)
+
+
+for _model in (Venue, Artist):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _invalidate_memory_index)
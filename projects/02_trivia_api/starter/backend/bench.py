@@ -0,0 +1,313 @@
+'''
+Benchmarks for the trivia API: the quiz engine, the integer category
+column, question serialization and response encoding, each against a
+generated question bank of a hundred thousand rows or more.
+
+The banks are seeded into BENCH_DATABASE_URL, whose questions and
+categories tables are dropped at the end, so give it its own database:
+
+    $ createdb trivia_bench
+    $ python bench.py [name ...]
+'''
+import json
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from flaskr import create_app
+from flaskr.quiz import next_question, question_ids
+from flaskr.encoding import JSON_ENCODERS, COMPRESSORS, orjson
+from models import db, Question, setup_question_search
+from migrate_category import migrate, INDEX_NAME
+
+BENCH_DATABASE_URL = os.environ.get(
+    'BENCH_DATABASE_URL', 'postgres://postgres@localhost:5432/trivia_bench')
+
+app = create_app({'DATABASE_PATH': BENCH_DATABASE_URL})
+
+CATEGORIES = 6
+
+
+@contextmanager
+def count_queries():
+    counter = {'count': 0, 'statements': []}
+
+    def on_execute(conn, cursor, statement, parameters, context, many):
+        counter['count'] += 1
+        counter['statements'].append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', on_execute)
+
+
+def seed(questions):
+    '''Fills the questions table server side, spread over the categories.'''
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    setup_question_search(db.engine)
+    db.session.execute(
+        "INSERT INTO categories (type) "
+        "SELECT 'Category ' || i FROM generate_series(1, :n) AS i",
+        {'n': CATEGORIES})
+    db.session.execute(
+        "INSERT INTO questions (question, answer, category, difficulty) "
+        "SELECT 'Question ' || i || '?', 'Answer ' || i, "
+        "1 + i % :categories, 1 + i % 5 "
+        "FROM generate_series(1, :n) AS i",
+        {'n': questions, 'categories': CATEGORIES})
+    db.session.commit()
+    question_ids.invalidate()
+
+
+def legacy_quiz_question(category_id, previous_questions):
+    '''What /quiz/play used to do (with the category cast it was missing).'''
+    if category_id == 0:
+        selection = db.session.query(Question.id).all()
+    else:
+        selection = db.session.query(Question.id).\
+            filter(Question.category == str(category_id)).all()
+
+    questions = [i for i, in selection]
+    remaining_questions = [question for question in questions
+                           if question not in previous_questions]
+    if len(remaining_questions) == 0:
+        return None
+    return Question.query.get(random.choice(remaining_questions))
+
+
+def bench_quiz(questions=100000, previous_sizes=(0, 100, 1000), rounds=20):
+    '''
+    Picks quiz questions from a large bank with growing previous_questions
+    lists, the old way and through the quiz engine. The engine must never
+    repeat a question and take a single query per pick once warm.
+    '''
+    seed(questions)
+    rng = random.Random(0)
+    ok = True
+
+    print('%8s %9s %-8s %10s %8s' % ('category', 'previous', 'engine', 'ms/pick', 'queries'))
+    for category_id in (0, 3):
+        for size in previous_sizes:
+            previous = rng.sample(range(1, questions + 1), size)
+            previous_set = set(previous)
+
+            # The legacy scan is O(questions x previous), keep its run short.
+            for label, pick, n in (('legacy', legacy_quiz_question, 1 if size else rounds),
+                                   ('engine', next_question, rounds)):
+                pick(category_id, previous)  # warm up
+                with count_queries() as counter:
+                    start = time.perf_counter()
+                    picked = [pick(category_id, previous) for _ in range(n)]
+                    elapsed = (time.perf_counter() - start) * 1000 / n
+
+                queries = counter['count'] / n
+                print('%8d %9d %-8s %10.2f %8.1f' % (category_id, size, label, elapsed, queries))
+                if label == 'engine':
+                    ok = ok and queries == 1 and all(
+                        question.id not in previous_set for question in picked)
+                db.session.remove()
+
+    return ok
+
+
+def dump_questions(path=os.path.join(os.path.dirname(__file__), 'trivia.psql')):
+    '''The (question, answer, difficulty, category) rows of trivia.psql.'''
+    rows = []
+    with open(path) as dump:
+        for line in dump:
+            if line.startswith('COPY public.questions'):
+                break
+        for line in dump:
+            if line.startswith('\\.'):
+                break
+            id, question, answer, difficulty, category = line.rstrip('\n').split('\t')
+            rows.append((question, answer, int(difficulty), int(category)))
+    return rows
+
+
+def seed_legacy(copies, spread):
+    '''
+    Copies the trivia.psql questions copies times into a questions table
+    shaped like the one the String model created: text category, no index,
+    no foreign key. Copy i moves its categories i % spread blocks of 6 up,
+    for 6 * spread categories in all.
+    '''
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    db.session.execute('ALTER TABLE questions DROP CONSTRAINT IF EXISTS questions_category_fkey')
+    db.session.execute('DROP INDEX IF EXISTS {}'.format(INDEX_NAME))
+    db.session.execute('ALTER TABLE questions ALTER COLUMN category TYPE varchar')
+    db.session.execute(
+        "INSERT INTO categories (type) "
+        "SELECT 'Category ' || i FROM generate_series(1, :n) AS i", {'n': 6 * spread})
+
+    db.session.execute('CREATE TEMPORARY TABLE dump_questions '
+                       '(question text, answer text, difficulty integer, category integer)')
+    db.session.execute('INSERT INTO dump_questions VALUES (:question, :answer, :difficulty, :category)', [
+        {'question': question, 'answer': answer, 'difficulty': difficulty, 'category': category}
+        for question, answer, difficulty, category in dump_questions()])
+    db.session.execute(
+        'INSERT INTO questions (question, answer, difficulty, category) '
+        'SELECT question, answer, difficulty, (category + 6 * (i % :spread))::text '
+        'FROM dump_questions, generate_series(0, :copies - 1) AS i',
+        {'copies': copies, 'spread': spread})
+    db.session.commit()
+    db.session.execute('ANALYZE questions')
+    db.session.commit()
+
+
+CATEGORY_QUERIES = [
+    ('category page', 'SELECT * FROM questions WHERE category = :category ORDER BY id LIMIT 10'),
+    ('quiz ids', 'SELECT id FROM questions WHERE category = :category'),
+    ('category count', 'SELECT count(*) FROM questions WHERE category = :category'),
+]
+
+
+def bench_category_column(copies=25000, spread=100, rounds=50):
+    '''
+    Times the per category queries on a trivia.psql derived bank of
+    copies * 19 questions before and after migrate_category.py. After, each
+    must use the index and be faster.
+    '''
+    seed_legacy(copies, spread)
+    rng = random.Random(0)
+    categories = [rng.randint(1, 6 * spread) for _ in range(rounds)]
+
+    def run(label, cast):
+        timings = {}
+        for name, sql in CATEGORY_QUERIES:
+            start = time.perf_counter()
+            for category in categories:
+                db.session.execute(sql, {'category': cast(category)}).fetchall()
+            timings[name] = (time.perf_counter() - start) * 1000 / rounds
+            plan = db.session.execute('EXPLAIN ' + sql, {'category': cast(category)}).fetchall()
+            uses_index = any(INDEX_NAME in line for line, in plan)
+            print('%-8s %-16s %10.2f ms %s' % (label, name, timings[name],
+                                              'index' if uses_index else 'no index'))
+        db.session.commit()
+        return timings
+
+    before = run('text', str)
+    migrate(db.engine, log=lambda message: None)
+    db.session.execute('ANALYZE questions')
+    after = run('integer', int)
+
+    return all(after[name] < before[name] for name in before)
+
+
+ENCODING_REQUESTS = [
+    ('questions', 'GET', '/questions?limit=100', None),
+    ('search', 'POST', '/questions?limit=100', {'searchTerm': 'question'}),
+]
+
+
+def bench_encoding(questions=100000, rounds=200):
+    '''
+    Serializes 100 question pages of /questions and of a search with each
+    JSON encoder, the way jsonify does, then compresses the body with each
+    encoding. orjson (when installed) must be faster than the standard
+    library and every encoding must shrink the body.
+    '''
+    seed(questions)
+    client = app.test_client()
+    ok = True
+
+    print('%-10s %-8s %10s' % ('response', 'encoder', 'ms/dump'))
+    bodies = {}
+    for name, method, path, body in ENCODING_REQUESTS:
+        payload = client.open(path, method=method, json=body).get_json()
+        timings = {}
+        for encoder_name, encoder in sorted(JSON_ENCODERS.items()):
+            if encoder_name == 'orjson' and orjson is None:
+                continue
+            start = time.perf_counter()
+            for _ in range(rounds):
+                data = json.dumps(payload, cls=encoder, sort_keys=True)
+            timings[encoder_name] = (time.perf_counter() - start) * 1000 / rounds
+            print('%-10s %-8s %10.3f' % (name, encoder_name, timings[encoder_name]))
+        ok = ok and timings.get('orjson', 0) <= timings['json']
+        bodies[name] = data.encode('utf-8')
+
+    print('\n%-10s %-8s %10s %10s' % ('response', 'encoding', 'bytes', 'ms'))
+    with app.app_context():
+        for name, data in bodies.items():
+            print('%-10s %-8s %10d %10s' % (name, 'identity', len(data), '-'))
+            for encoding, compressor in sorted(COMPRESSORS.items()):
+                start = time.perf_counter()
+                for _ in range(rounds // 10):
+                    compressed = compressor(data)
+                elapsed = (time.perf_counter() - start) * 1000 / (rounds // 10)
+                print('%-10s %-8s %10d %10.3f' % (name, encoding, len(compressed), elapsed))
+                ok = ok and len(compressed) < len(data)
+
+    return ok
+
+
+def bench_row_serialization(questions=100000, sizes=(10, 100, 10000), rounds=20):
+    '''
+    Builds the question dicts of the list endpoints from Question instances
+    (format()) and from selected columns (format_row()). The projected read
+    must give the same dicts, in less time per row from 100 rows up (below
+    that the round trip dominates both).
+    '''
+    seed(questions)
+    ok = True
+
+    print('%8s %-10s %10s' % ('rows', 'read', 'us/row'))
+    for size in sizes:
+        results = {}
+        for label, read in (
+                ('orm', lambda: [question.format() for question in
+                                 Question.query.order_by(Question.id).limit(size)]),
+                ('columns', lambda: [Question.format_row(row) for row in
+                                     Question.query.with_entities(*Question.format_columns())
+                                     .order_by(Question.id).limit(size)])):
+            n = max(1, rounds * 100 // size)
+            start = time.perf_counter()
+            for _ in range(n):
+                rows = read()
+                db.session.remove()
+            elapsed = (time.perf_counter() - start) * 1e6 / (n * size)
+            results[label] = (elapsed, rows)
+            print('%8d %-10s %10.2f' % (size, label, elapsed))
+        ok = ok and results['columns'][1] == results['orm'][1] and \
+            (size < 100 or results['columns'][0] < results['orm'][0])
+
+    return ok
+
+
+# python bench.py quiz rows only seeds what those two need; the message is
+# printed when the benchmark returns False.
+BENCHMARKS = {
+    'quiz': (bench_quiz, 'quiz engine repeated a question or took more than one query'),
+    'category': (bench_category_column, 'category queries are not faster on the integer column'),
+    'rows': (bench_row_serialization, 'column rows differ from format() or are not faster'),
+    'encoding': (bench_encoding, 'orjson is slower than json or a compressed body is not smaller'),
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    failures = []
+    with app.app_context():
+        for name in names:
+            bench, failure = BENCHMARKS[name]
+            print('\n# ' + name)
+            if not bench():
+                failures.append(failure)
+        db.session.remove()
+        db.drop_all()
+
+    for failure in failures:
+        print('FAIL: ' + failure)
+    if failures:
+        sys.exit(1)
@@ -1,25 +1,57 @@
+import codecs
+import csv
+import json
 import os
+import click
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import random
 
-from models import setup_db, Question, Category, db
-
-QUESTIONS_PER_PAGE = 10
+from models import setup_db, Question, Category, db, database_path
+from .stats import question_stats
+from .pagination import paginate, page_size, QUESTIONS_PER_PAGE
+from .quiz import next_question, question_ids, ALL_CATEGORIES
+from .sessions import make_session_store
+from .categories import category_cache
+from .search import find_questions
+from .ingest import ingest, read_rows, FORMATS as INGEST_FORMATS
+from .encoding import json_encoder, compress
 
 
 def get_all_categories():
-    selection = Category.query.all()
-    return {category.id: category.type for category in selection}
+    return category_cache.categories()
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+    setup_db(app, app.config.get('DATABASE_PATH', database_path))
     CORS(app)
 
+    # See flaskr/encoding.py. JSON_ENCODER None takes orjson when installed.
+    app.json_encoder = json_encoder(app.config.get('JSON_ENCODER'))
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+    app.after_request(compress)
+
+    # See flaskr/sessions.py for the stores. QUIZ_SESSION_LENGTH bounds the
+    # order drawn for a session, None draws the whole category.
+    app.config.setdefault('QUIZ_SESSION_STORE', 'memory')
+    app.config.setdefault('QUIZ_SESSION_TTL', 3600)
+    app.config.setdefault('QUIZ_SESSION_LENGTH', 100)
+    # How long browsers and CDNs may reuse /categories without asking.
+    app.config.setdefault('CATEGORIES_MAX_AGE', 300)
+    # Rows per transaction of POST /questions/bulk, and how many of the
+    # rejected rows it lists.
+    app.config.setdefault('INGEST_CHUNK_SIZE', 5000)
+    app.config.setdefault('INGEST_MAX_ERRORS', 1000)
+    session_store = make_session_store(app.config['QUIZ_SESSION_STORE'],
+                                       app.config['QUIZ_SESSION_TTL'])
+
     @app.after_request
     def after_request(response):
         response.headers.add('Access-Control-Allow-Headers',
@@ -30,35 +62,36 @@ def create_app(test_config=None):
 
     @app.route('/questions')
     def retrieve_questions():
-        page = request.args.get('page', 1, type=int)
         categories = get_all_categories()
+        selection = paginate(
+            Question.query.with_entities(*Question.format_columns()),
+            Question.id)
 
-        try:
-            selection = Question.query.order_by(Question.id).\
-                        paginate(page, QUESTIONS_PER_PAGE).items
-        except:
-            abort(404)
-
-        questions = [question.format() for question in selection]
+        questions = [Question.format_row(row) for row in selection.items]
         return jsonify({
             'success': True,
             'questions': questions,
+            'nextCursor': selection.next_cursor,
             'currentCategory': 3,
             'categories': categories,
-            'totalQuestions': len(Question.query.all())
+            'totalQuestions': question_stats.total()
         })
 
     @app.route('/categories')
     def retrieve_categories():
-        categories = get_all_categories()
+        version, categories = category_cache.get()
 
         if len(categories) == 0:
             abort(404)
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'categories': categories,
         })
+        response.set_etag(version)
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['CATEGORIES_MAX_AGE']
+        return response.make_conditional(request)
 
     @app.route('/questions/add', methods=['POST'])
     def create_new_question():
@@ -74,17 +107,53 @@ def create_app(test_config=None):
 
             db.session.add(new_question)
             db.session.commit()
-
-            return jsonify({
-                'success': True,
-                'created': new_question.id
-            }), 200
+            created = new_question.id
         except:
             db.session.rollback()
             abort(422)
         finally:
             db.session.close()
 
+        # The question is saved; bookkeeping must not turn that into a 422.
+        question_stats.added(category)
+        question_ids.invalidate(category)
+
+        return jsonify({
+            'success': True,
+            'created': created
+        }), 200
+
+    @app.route('/questions/bulk', methods=['POST'])
+    def bulk_create_questions():
+        format = request.args.get('format', INGEST_FORMATS.get(request.mimetype))
+        if format not in ('csv', 'ndjson'):
+            abort(400)
+
+        errors = []
+
+        def on_reject(line_number, row_errors):
+            if len(errors) < app.config['INGEST_MAX_ERRORS']:
+                errors.append({'line': line_number, 'errors': row_errors})
+
+        # Rows are read off the request body as they arrive, never all at once.
+        stream = codecs.getreader('utf-8')(request.stream)
+        try:
+            report = ingest(read_rows(stream, format),
+                            app.config['INGEST_CHUNK_SIZE'], on_reject)
+        except (UnicodeDecodeError, csv.Error):
+            abort(400)
+        except Exception:
+            abort(422)
+        finally:
+            db.session.close()
+
+        return jsonify({
+            'success': True,
+            'created': report.created,
+            'rejected': report.rejected,
+            'errors': errors
+        })
+
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
     def delete_question(question_id):
         try:
@@ -94,52 +163,69 @@ def create_app(test_config=None):
             if question is None:
                 abort(404)
 
+            category = question.category
             db.session.delete(question)
             db.session.commit()
-
-            return jsonify({
-                'success': True,
-                'deleted': question_id
-            })
-
         except:
             db.session.rollback()
             abort(422)
         finally:
             db.session.close()
 
+        question_stats.deleted(category)
+        question_ids.invalidate(category)
+
+        return jsonify({
+            'success': True,
+            'deleted': question_id
+        })
+
     @app.route('/questions', methods=['POST'])
     def search_questions():
-        body = request.get_json()
+        body = request.get_json() or {}
 
         searchTerm = body.get("searchTerm", None)
-        search_results = Question.query.\
-            filter(Question.question.ilike("%{}%".format(searchTerm))).all()
+        category = body.get("category", request.args.get('category'))
+        page = body.get("page", request.args.get('page', 1))
+        try:
+            page = int(page)
+            category = int(category) if category not in (None, '') else None
+        except (TypeError, ValueError):
+            abort(400)
+
+        total, search_results = find_questions(
+            searchTerm, category, page, page_size())
+        if not search_results and page > 1:
+            abort(404)
         questions = [question.format() for question in search_results]
 
         return jsonify({
             'success': True,
             'questions': questions,
-            'totalQuestions': len(Question.query.all()),
-            'currentCategory': None  # Not used in search
+            'totalQuestions': total,
+            'currentCategory': get_all_categories().get(category)
         })
 
-    @app.route('/categories/<category_id>/questions')
+    @app.route('/categories/<int:category_id>/questions')
     def list_questions_from_category(category_id):
 
-        selection = Question.query.\
-            filter(Question.category == category_id).all()
-        questions = [question.format() for question in selection]
-        category = Category.query.get(category_id)
+        category = get_all_categories().get(category_id)
 
         if category is None:
             abort(404)
 
+        selection = paginate(
+            Question.query.with_entities(*Question.format_columns())
+            .filter(Question.category == category_id),
+            Question.id, paged_by_default=False)
+        questions = [Question.format_row(row) for row in selection.items]
+
         return jsonify({
             'success': True,
             'questions': questions,
-            'totalQuestions': len(Question.query.all()),
-            'currentCategory': category.type
+            'nextCursor': selection.next_cursor,
+            'totalQuestions': question_stats.in_category(category_id),
+            'currentCategory': category
         })
 
     @app.route('/quiz/play', methods=['POST'])
@@ -148,30 +234,91 @@ def create_app(test_config=None):
         category = body.get("quiz_category", None)
         previous_questions = body.get("previous_questions", None)
 
-        if category['id'] == 0:
-            selection = db.session.query(Question.id).all()
-        else:
-            selection = db.session.query(Question.id).\
-                filter(Question.category == category['id']).all()
-
-        questions = [i for i, in selection]
-        remaining_questions = [question for question in questions
-                               if question not in previous_questions]
+        question = next_question(int(category['id']), previous_questions)
 
         # The game is over
-        if len(remaining_questions) == 0:
+        if question is None:
             return jsonify({
                 'success': True
             })
 
-        question_id = random.choice(remaining_questions)
-        question = Question.query.get(question_id).format()
+        return jsonify({
+            'success': True,
+            'question': question.format()
+        })
+
+    @app.route('/quiz/sessions', methods=['POST'])
+    def create_quiz_session():
+        body = request.get_json() or {}
+        category = body.get("quiz_category") or {'id': ALL_CATEGORIES}
+        length = body.get("questions", app.config['QUIZ_SESSION_LENGTH'])
+
+        try:
+            category_id = int(category['id'])
+        except (KeyError, TypeError, ValueError):
+            abort(422)
+
+        if category_id != ALL_CATEGORIES and \
+                category_id not in get_all_categories():
+            abort(404)
+
+        try:
+            ids = question_ids.get(category_id)
+            if length is not None:
+                length = min(int(length), len(ids))
+            order = random.sample(ids, len(ids) if length is None else length)
+        except (KeyError, TypeError, ValueError):
+            abort(422)
 
         return jsonify({
             'success': True,
-            'question': question
+            'session': session_store.create(order),
+            'totalQuestions': len(order)
+        })
+
+    @app.route('/quiz/sessions/<session_id>/next')
+    def next_quiz_session_question(session_id):
+        try:
+            question_id = session_store.pop(session_id)
+        except KeyError:
+            abort(404)
+
+        while question_id is not None:
+            question = Question.query.get(question_id)
+            if question is not None:
+                return jsonify({
+                    'success': True,
+                    'question': question.format()
+                })
+            # Deleted since the session was created.
+            question_id = session_store.pop(session_id)
+
+        # The game is over
+        return jsonify({
+            'success': True
         })
 
+    @app.cli.command('import-questions')
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+                  help='Defaults to csv for .csv files and ndjson otherwise.')
+    @click.option('--chunk-size', default=5000, help='Rows per transaction.')
+    @click.option('--rejects', type=click.File('w'),
+                  help='Write the line numbers and errors of rejected rows here as NDJSON.')
+    def import_questions(source, format, chunk_size, rejects):
+        """Bulk imports questions from a CSV or NDJSON file."""
+        if format is None:
+            format = 'csv' if source.name.endswith('.csv') else 'ndjson'
+
+        def on_reject(line_number, errors):
+            if rejects is not None:
+                rejects.write(json.dumps({'line': line_number, 'errors': errors}) + '\n')
+
+        report = ingest(read_rows(source, format), chunk_size, on_reject)
+        click.echo('%d questions imported, %d rejected in %.1fs (%d rows/s)' % (
+            report.created, report.rejected, report.seconds,
+            (report.created + report.rejected) / max(report.seconds, 1e-6)))
+
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({
@@ -180,36 +327,36 @@ def create_app(test_config=None):
             "message": "ressource not found"
         }), 404
 
-        @app.errorhandler(422)
-        def unprocessable(error):
-            return jsonify({
-                "success": False,
-                "error": 422,
-                "message": "unprocessable"
-            }), 422
+    @app.errorhandler(422)
+    def unprocessable(error):
+        return jsonify({
+            "success": False,
+            "error": 422,
+            "message": "unprocessable"
+        }), 422
 
-        @app.errorhandler(400)
-        def bad_request(error):
-            return jsonify({
-                "success": False,
-                "error": 400,
-                "message": "bad request"
-            }), 400
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "message": "bad request"
+        }), 400
 
-        @app.errorhandler(405)
-        def bad_request(error):
-            return jsonify({
-                "success": False,
-                "error": 405,
-                "message": "method not allowed"
-            }), 405
+    @app.errorhandler(405)
+    def bad_request(error):
+        return jsonify({
+            "success": False,
+            "error": 405,
+            "message": "method not allowed"
+        }), 405
 
-        @app.errorhandler(500)
-        def bad_request(error):
-            return jsonify({
-                "success": False,
-                "error": 500,
-                "message": "Internal Server Error"
-            }), 500
+    @app.errorhandler(500)
+    def bad_request(error):
+        return jsonify({
+            "success": False,
+            "error": 500,
+            "message": "Internal Server Error"
+        }), 500
 
     return app
@@ -0,0 +1,52 @@
+import hashlib
+import json
+import threading
+import time
+
+from models import Category
+
+'''
+CategoryCache
+    the {id: type} dict of categories, loaded once and served without
+    touching the database until ttl seconds have passed or invalidate()
+    is called
+
+    every load gets a version, a hash of its content, so all workers agree
+    on it and it can be sent as the ETag of /categories
+'''
+
+
+class CategoryCache(object):
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._categories = None
+        self._version = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        categories = {category.id: category.type
+                      for category in Category.query.order_by(Category.id)}
+        content = json.dumps(sorted(categories.items())).encode()
+        self._categories = categories
+        self._version = hashlib.sha1(content).hexdigest()
+        self._loaded_at = time.monotonic()
+
+    def get(self):
+        '''Returns (version, categories). Treat the dict as read-only.'''
+        with self._lock:
+            if self._categories is None or \
+                    time.monotonic() - self._loaded_at > self.ttl:
+                self._load()
+            return self._version, self._categories
+
+    def categories(self):
+        return self.get()[1]
+
+    def invalidate(self):
+        with self._lock:
+            self._categories = None
+
+
+category_cache = CategoryCache()
@@ -0,0 +1,111 @@
+import gzip
+
+from flask import current_app, request
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+'''
+json_encoder(name=None)
+    the JSONEncoder class jsonify serializes with, picked by create_app
+    from the JSON_ENCODER config key: 'orjson' when the orjson package is
+    installed, 'json' (the standard library, Flask's default) otherwise
+
+compress(response)
+    after_request hook gzip or brotli compressing JSON and text responses
+    of at least COMPRESS_MIN_SIZE bytes, with the best encoding the client
+    lists in Accept-Encoding (brotli only when the brotli package is
+    installed)
+'''
+
+
+class OrjsonEncoder(JSONEncoder):
+    '''
+    Flask 1.x hands jsonify's data to json.dumps(data, cls=app.json_encoder),
+    which only calls encode(), so overriding it swaps the serializer for
+    every jsonify call. Types orjson does not know go through Flask's
+    default().
+    '''
+
+    def encode(self, o):
+        # The categories dict is keyed by integer ids.
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(o, default=self.default, option=option).decode('utf-8')
+
+
+JSON_ENCODERS = {
+    'json': JSONEncoder,
+    'orjson': OrjsonEncoder
+}
+
+
+def json_encoder(name=None):
+    if name is None:
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_ENCODER orjson needs the orjson package')
+    return JSON_ENCODERS[name]
+
+
+def _gzip(data):
+    return gzip.compress(data, current_app.config['COMPRESS_LEVEL'])
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+
+
+COMPRESSORS = {'gzip': _gzip}
+if brotli is not None:
+    COMPRESSORS['br'] = _brotli
+
+COMPRESSIBLE = ('application/json', 'text/')
+
+
+def pick_encoding(accept_encodings):
+    '''The accepted encoding of highest quality, brotli first on a tie.'''
+    best, best_quality = None, 0
+    for name in ('br', 'gzip'):
+        if name in COMPRESSORS and accept_encodings[name] > best_quality:
+            best, best_quality = name, accept_encodings[name]
+    return best
+
+
+def compress(response):
+    # Passthrough bodies (send_file) and streams are never read into memory.
+    if response.direct_passthrough or response.is_streamed or \
+            not (response.mimetype or '').startswith(COMPRESSIBLE):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    # Without a Content-Length the size is unknown short of reading the body.
+    if not 200 <= response.status_code < 300 or response.status_code == 204 or \
+            'Content-Encoding' in response.headers or \
+            response.content_length is None or \
+            response.content_length < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = pick_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(COMPRESSORS[encoding](response.get_data()))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body is not byte for byte the one the ETag names; a
+    # weak ETag still matches If-None-Match, see /categories.
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,151 @@
+import csv
+import json
+import time
+from collections import namedtuple
+from itertools import islice
+
+from models import db, Question
+from .categories import category_cache
+from .quiz import question_ids
+from .search import SEARCH_BACKENDS
+from .stats import question_stats
+
+'''
+ingest(rows, chunk_size=5000, on_reject=None)
+    validates (line number, row) pairs of question fields and inserts the
+    valid ones with one multi-row INSERT per chunk, each chunk committed in
+    its own transaction
+
+    rows come from read_rows() over an NDJSON or CSV stream with question,
+    answer, category and difficulty fields. on_reject(line_number, errors)
+    is called for each invalid row, and for each row of a chunk the
+    database refused, which is rolled back while the import carries on.
+    Used by POST /questions/bulk and
+
+        $ flask import-questions questions.ndjson
+'''
+
+FORMATS = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonlines': 'ndjson',
+    'text/csv': 'csv'
+}
+
+IngestReport = namedtuple('IngestReport', ['created', 'rejected', 'seconds'])
+
+
+def read_rows(stream, format):
+    '''Yields (line number, row dict); a line that is not JSON gives None.'''
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'ndjson':
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError:
+                    yield line_number, None
+    else:
+        raise ValueError('unknown format: {!r}'.format(format))
+
+
+def validate(row, categories):
+    '''Returns (values, None) or (None, {field: [messages]}).'''
+    if not isinstance(row, dict):
+        return None, {'row': ['not a JSON object']}
+
+    errors = {}
+    values = {}
+    for field in ('question', 'answer'):
+        text = row.get(field)
+        if not isinstance(text, str) or not text.strip():
+            errors[field] = ['This field is required.']
+        else:
+            values[field] = text.strip()
+
+    for field in ('category', 'difficulty'):
+        try:
+            values[field] = int(row.get(field))
+        except (TypeError, ValueError):
+            errors[field] = ['Must be a whole number.']
+
+    if 'category' not in errors and values['category'] not in categories:
+        errors['category'] = ['Unknown category: {}'.format(values['category'])]
+    if 'difficulty' not in errors and not 1 <= values['difficulty'] <= 5:
+        errors['difficulty'] = ['Must be between 1 and 5.']
+
+    return (None, errors) if errors else (values, None)
+
+
+def _write(session, table, rows):
+    connection = session.connection()
+    if connection.dialect.name != 'postgresql':
+        connection.execute(table.insert(), rows)
+        return
+
+    # One INSERT ... VALUES (...), (...) statement for the whole chunk, put
+    # together by psycopg2 rather than the SQLAlchemy compiler, which takes
+    # longer over thousands of rows than the database takes to insert them.
+    from psycopg2.extras import execute_values
+    columns = list(rows[0])
+    quote = connection.dialect.identifier_preparer.quote
+    cursor = connection.connection.cursor()
+    execute_values(
+        cursor,
+        'INSERT INTO {} ({}) VALUES %s'.format(
+            quote(table.name), ', '.join(quote(column) for column in columns)),
+        [tuple(row[column] for column in columns) for row in rows],
+        page_size=len(rows))
+
+
+def ingest(rows, chunk_size=5000, on_reject=None):
+    categories = category_cache.categories()
+    table = Question.__table__
+
+    def reject(line_number, errors):
+        if on_reject is not None:
+            on_reject(line_number, errors)
+
+    created = rejected = 0
+    start = time.perf_counter()
+    rows = iter(rows)
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            valid = []
+            for line_number, row in chunk:
+                values, row_errors = validate(row, categories)
+                if row_errors:
+                    rejected += 1
+                    reject(line_number, row_errors)
+                else:
+                    valid.append((line_number, values))
+
+            if valid:
+                try:
+                    _write(db.session, table, [values for _, values in valid])
+                    db.session.commit()
+                except Exception as error:
+                    # The chunk is lost as a whole; earlier ones stay committed.
+                    db.session.rollback()
+                    rejected += len(valid)
+                    message = str(error).splitlines()[0] if str(error) else type(error).__name__
+                    for line_number, _ in valid:
+                        reject(line_number, {'database': [message]})
+                    continue
+                created += len(valid)
+    finally:
+        if created:
+            # Core inserts skip the ORM events and handlers that keep these
+            # current. Done even when reading the stream fails part way, as
+            # the chunks before it are committed.
+            question_stats.invalidate()
+            question_ids.invalidate()
+            SEARCH_BACKENDS['memory'].invalidate()
+
+    return IngestReport(created, rejected, time.perf_counter() - start)
@@ -0,0 +1,80 @@
+import base64
+import binascii
+from collections import namedtuple
+
+from flask import abort, current_app, request
+
+QUESTIONS_PER_PAGE = 10
+MAX_PAGE_SIZE = 100
+
+'''
+paginate(query, key, paged_by_default=True)
+    one page of query in key order, driven by the request arguments
+
+    ?after=<cursor>&limit=<n>  keyset paging: rows whose key is past the
+                               cursor, found through the index on key
+                               however deep the page
+    ?page=<n>                  the OFFSET paging the frontend uses
+
+    with neither it serves page 1, or every row when paged_by_default is
+    False. limit is capped at the MAX_PAGE_SIZE config value. Returns a
+    Page whose next_cursor is the token of the following keyset page, None
+    on the last one.
+'''
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(str(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    '''
+    The question id an after= token points past. A token that is not the
+    base64 of an integer, e.g. one edited by hand, raises ValueError.
+    '''
+    try:
+        return int(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode())
+    except (TypeError, UnicodeDecodeError, binascii.Error):
+        raise ValueError('invalid cursor: {!r}'.format(token))
+
+
+def page_size():
+    limit = request.args.get('limit', QUESTIONS_PER_PAGE, type=int)
+    return max(1, min(limit, current_app.config.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE)))
+
+
+def _next_cursor(rows, limit, key):
+    if len(rows) <= limit:
+        return Page(rows, None)
+    return Page(rows[:limit], encode_cursor(getattr(rows[limit - 1], key.key)))
+
+
+def keyset_page(query, key, after=None, limit=QUESTIONS_PER_PAGE):
+    if after:
+        query = query.filter(key > decode_cursor(after))
+    rows = query.order_by(key).limit(limit + 1).all()
+    return _next_cursor(rows, limit, key)
+
+
+def offset_page(query, key, page, limit=QUESTIONS_PER_PAGE):
+    '''Aborts with a 404 past the last page, like paginate() used to.'''
+    if page < 1:
+        abort(404)
+    rows = query.order_by(key).offset((page - 1) * limit).limit(limit + 1).all()
+    if not rows and page > 1:
+        abort(404)
+    return _next_cursor(rows, limit, key)
+
+
+def paginate(query, key, paged_by_default=True):
+    args = request.args
+    if 'after' in args or ('limit' in args and 'page' not in args):
+        try:
+            return keyset_page(query, key, args.get('after'), page_size())
+        except ValueError:
+            abort(400)
+    if 'page' in args or paged_by_default:
+        return offset_page(query, key, args.get('page', 1, type=int), page_size())
+    return Page(query.order_by(key).all(), None)
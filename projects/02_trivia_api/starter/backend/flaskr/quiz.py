@@ -0,0 +1,88 @@
+import random
+import threading
+import time
+
+from models import db, Question
+
+ALL_CATEGORIES = 0
+
+'''
+next_question(category_id, previous_questions)
+    a random question of the category (0 for every category) that is not
+    in previous_questions, or None once they have all been asked
+
+    the question ids of each category are cached in process, so a pick is
+    a few random draws against a set of the previous ids followed by one
+    primary key lookup, whatever the size of the bank or of the list
+'''
+
+
+class QuestionIds(object):
+    '''
+    The question ids of each category, loaded on first use. Writes drop the
+    cached ids of the category they touch; every ttl seconds all of them
+    are reread to pick up writes made by other workers.
+    '''
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def get(self, category_id):
+        with self._lock:
+            entry = self._ids.get(category_id)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                return entry[1]
+
+        query = db.session.query(Question.id)
+        if category_id != ALL_CATEGORIES:
+            query = query.filter(Question.category == category_id)
+        ids = tuple(id for id, in query)
+
+        with self._lock:
+            self._ids[category_id] = (time.monotonic(), ids)
+        return ids
+
+    def invalidate(self, category_id=None):
+        with self._lock:
+            if category_id is None:
+                self._ids.clear()
+            else:
+                self._ids.pop(int(category_id), None)
+                self._ids.pop(ALL_CATEGORIES, None)
+
+
+question_ids = QuestionIds()
+
+
+def pick_id(ids, previous, rng=random):
+    '''
+    Draws from ids until one is not in the previous set. When most of the
+    ids have been asked that could take long, so past half the remaining
+    ones are listed and drawn from instead.
+    '''
+    if len(previous) * 2 < len(ids):
+        while True:
+            id = ids[rng.randrange(len(ids))]
+            if id not in previous:
+                return id
+
+    remaining = [id for id in ids if id not in previous]
+    return rng.choice(remaining) if remaining else None
+
+
+def next_question(category_id, previous_questions, rng=random):
+    previous = set(previous_questions or ())
+    for attempt in range(2):
+        question_id = pick_id(question_ids.get(category_id), previous, rng)
+        if question_id is None:
+            return None
+
+        question = Question.query.get(question_id)
+        if question is not None:
+            return question
+
+        # Deleted by another worker since the ids were cached.
+        question_ids.invalidate(category_id)
+    return None
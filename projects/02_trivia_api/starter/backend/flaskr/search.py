@@ -0,0 +1,149 @@
+import re
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import column, event, func, literal_column
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from models import db, Question, SEARCH_CONFIG
+
+'''
+find_questions(term, category_id=None, page=1, per_page=10)
+    full-text search of the question and answer text, every word of term
+    matched, the last one as a prefix so partial input finds something;
+    best ranked first, questions matching in their question text above
+    those matching only in their answer, one page at a time
+
+    returns (number of matches, questions of the page). An empty term
+    lists every question of the category in id order.
+
+    on PostgreSQL this reads the search_vector column migrate_search.py
+    adds; SQLite test databases fall back to a word index held in process.
+    SEARCH_BACKEND ('postgres' or 'memory') overrides that, which is how
+    the tests compare the two
+'''
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def find_questions(term, category_id=None, page=1, per_page=10):
+    words = WORD.findall((term or '').lower())
+    return get_search_backend().search(words, category_id, max(page, 1), per_page)
+
+
+class PostgresSearch(object):
+    '''
+    Matches the generated search_vector column through its GIN index and
+    ranks with ts_rank. The total comes back with the page through a
+    window count.
+    '''
+
+    search_vector = column('search_vector', TSVECTOR)
+
+    def search(self, words, category_id, page, per_page):
+        query = db.session.query(Question, func.count().over().label('total'))
+        if category_id is not None:
+            query = query.filter(Question.category == category_id)
+
+        if words:
+            # Words are \w+ only, so they are safe inside a tsquery.
+            tsquery = func.to_tsquery(literal_column("'{}'".format(SEARCH_CONFIG)),
+                                      ' & '.join(words) + ':*')
+            query = query.filter(self.search_vector.op('@@')(tsquery))\
+                .order_by(func.ts_rank(self.search_vector, tsquery).desc())
+
+        rows = query.order_by(Question.id)\
+            .limit(per_page)\
+            .offset((page - 1) * per_page)\
+            .all()
+        return (rows[0].total if rows else 0), [row.Question for row in rows]
+
+
+class InMemorySearch(object):
+    '''
+    Word -> question ids inverted index kept in process, for databases
+    without full-text search such as SQLite test runs. Built on first use
+    and thrown away whenever a question is written. Words are not stemmed.
+    '''
+
+    QUESTION_WEIGHT = 1.0
+    ANSWER_WEIGHT = 0.4
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def _build(self):
+        postings = defaultdict(dict)  # word -> {id: weight}
+        categories = {}
+        for id, question, answer, category in db.session.query(
+                Question.id, Question.question, Question.answer, Question.category):
+            categories[id] = category
+            for text, weight in ((answer, self.ANSWER_WEIGHT),
+                                 (question, self.QUESTION_WEIGHT)):
+                for word in WORD.findall((text or '').lower()):
+                    postings[word][id] = max(postings[word].get(id, 0), weight)
+        return postings, sorted(postings), categories
+
+    def _get(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._build()
+            return self._index
+
+    def search(self, words, category_id, page, per_page):
+        postings, vocabulary, categories = self._get()
+
+        if words:
+            scores = None
+            for i, word in enumerate(words):
+                matches = {}
+                # The last word is a prefix, like the :* of the tsquery.
+                candidates = [word] if i < len(words) - 1 else \
+                    [w for w in vocabulary if w.startswith(word)]
+                for candidate in candidates:
+                    for id, weight in postings.get(candidate, {}).items():
+                        matches[id] = max(matches.get(id, 0), weight)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {id: scores[id] + weight
+                              for id, weight in matches.items() if id in scores}
+        else:
+            scores = dict.fromkeys(categories, 0)
+
+        if category_id is not None:
+            scores = {id: score for id, score in scores.items()
+                      if categories[id] == category_id}
+
+        ranked = sorted(scores, key=lambda id: (-scores[id], id))
+        page_ids = ranked[(page - 1) * per_page:page * per_page]
+        questions = {question.id: question for question in
+                     Question.query.filter(Question.id.in_(page_ids))}
+        return len(ranked), [questions[id] for id in page_ids if id in questions]
+
+
+SEARCH_BACKENDS = {
+    'postgres': PostgresSearch(),
+    'memory': InMemorySearch()
+}
+
+
+def get_search_backend():
+    name = current_app.config.get('SEARCH_BACKEND')
+    if name is None:
+        name = 'postgres' if db.engine.dialect.name == 'postgresql' else 'memory'
+    return SEARCH_BACKENDS[name]
+
+
+def _invalidate_memory_index(mapper, connection, target):
+    SEARCH_BACKENDS['memory'].invalidate()
+
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Question, _event, _invalidate_memory_index)
@@ -0,0 +1,185 @@
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+'''
+Quiz sessions
+
+    POST /quiz/sessions draws a shuffled question order for a category once
+    and keeps it server side; GET /quiz/sessions/<id>/next pops the next
+    question id off it. Clients no longer send the questions they have
+    already seen.
+
+    The store is picked by the QUIZ_SESSION_STORE config value:
+
+    'memory'                  per process, for a single worker
+    'sqlite:////path/to.db'   a SQLite file shared by the workers of a host
+    'redis://host:6379/0'     any Redis-compatible server (needs redis)
+
+    Every store has the same two calls: create(question_ids) returns a new
+    session id, pop(session_id) returns the next question id, None once
+    they have all been asked, and raises KeyError for an unknown or
+    expired session. Sessions expire ttl seconds after their last use.
+'''
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+class MemorySessionStore(object):
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # id -> (expires_at, deque of ids)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # Kept in order of last use, so the expired ones are at the front.
+        while self._sessions:
+            session_id, (expires_at, order) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[session_id]
+
+    def create(self, question_ids):
+        session_id = new_session_id()
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            self._sessions[session_id] = (now + self.ttl, deque(question_ids))
+        return session_id
+
+    def pop(self, session_id):
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            expires_at, order = self._sessions[session_id]
+            self._sessions[session_id] = (now + self.ttl, order)
+            self._sessions.move_to_end(session_id)
+            return order.popleft() if order else None
+
+
+class SQLiteSessionStore(object):
+    '''
+    One row per session holding its position, one row per (session,
+    position) holding the question id, so a pop is two primary key lookups
+    and an update in a single write transaction.
+    '''
+
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS quiz_sessions (
+                    id TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_quiz_sessions_expires_at
+                    ON quiz_sessions (expires_at);
+                CREATE TABLE IF NOT EXISTS quiz_session_questions (
+                    session_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    PRIMARY KEY (session_id, position)
+                ) WITHOUT ROWID;
+            ''')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def _evict(self, connection, now):
+        expired = [id for id, in connection.execute(
+            'SELECT id FROM quiz_sessions WHERE expires_at <= ?', (now,))]
+        connection.executemany('DELETE FROM quiz_session_questions WHERE session_id = ?',
+                               [(id,) for id in expired])
+        connection.executemany('DELETE FROM quiz_sessions WHERE id = ?',
+                               [(id,) for id in expired])
+
+    def create(self, question_ids):
+        session_id = new_session_id()
+        now = time.time()
+        with self._connection() as connection:
+            self._evict(connection, now)
+            connection.execute('INSERT INTO quiz_sessions VALUES (?, 0, ?)',
+                               (session_id, now + self.ttl))
+            connection.executemany('INSERT INTO quiz_session_questions VALUES (?, ?, ?)',
+                                   [(session_id, position, question_id)
+                                    for position, question_id in enumerate(question_ids)])
+        return session_id
+
+    def pop(self, session_id):
+        now = time.time()
+        with self._connection() as connection:
+            # Take the write lock up front so two workers never pop the same
+            # position.
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                'SELECT position FROM quiz_sessions WHERE id = ? AND expires_at > ?',
+                (session_id, now)).fetchone()
+            if row is None:
+                raise KeyError(session_id)
+
+            question = connection.execute(
+                'SELECT question_id FROM quiz_session_questions '
+                'WHERE session_id = ? AND position = ?', (session_id, row[0])).fetchone()
+            connection.execute(
+                'UPDATE quiz_sessions SET position = position + 1, expires_at = ? WHERE id = ?',
+                (now + self.ttl, session_id))
+            return question[0] if question is not None else None
+
+
+class RedisSessionStore(object):
+    '''
+    The order is a Redis list popped from the left, next to a marker key
+    that tells a finished session from an unknown one.
+    '''
+
+    def __init__(self, url, ttl=3600, prefix='trivia:quiz:'):
+        # Only this store needs the redis client.
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def create(self, question_ids):
+        session_id = new_session_id()
+        key = self.prefix + session_id
+        pipe = self._redis.pipeline()
+        pipe.setex(key, self.ttl, 1)
+        if question_ids:
+            pipe.rpush(key + ':order', *question_ids)
+            pipe.expire(key + ':order', self.ttl)
+        pipe.execute()
+        return session_id
+
+    def pop(self, session_id):
+        key = self.prefix + session_id
+        pipe = self._redis.pipeline()
+        pipe.expire(key, self.ttl)
+        pipe.lpop(key + ':order')
+        pipe.expire(key + ':order', self.ttl)
+        exists, question_id, _ = pipe.execute()
+        if not exists:
+            raise KeyError(session_id)
+        return int(question_id) if question_id is not None else None
+
+
+def make_session_store(url, ttl=3600):
+    if url == 'memory':
+        return MemorySessionStore(ttl)
+    if url.startswith('sqlite:///'):
+        return SQLiteSessionStore(url[len('sqlite:///'):], ttl)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisSessionStore(url, ttl)
+    raise ValueError('unknown QUIZ_SESSION_STORE: {!r}'.format(url))
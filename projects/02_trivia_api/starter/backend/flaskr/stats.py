@@ -0,0 +1,71 @@
+import threading
+import time
+
+from sqlalchemy import func
+
+from models import db, Question
+
+'''
+QuestionStats
+    total and per category question counts, read with a single
+    SELECT category, COUNT(*) ... GROUP BY and kept in process
+
+    create_new_question and delete_question adjust the counts as they
+    commit, so this process never has to count again; the counts are reread
+    every ttl seconds to pick up writes made by other workers
+'''
+
+
+def _category_key(category_id):
+    # Categories come in from URLs and JSON bodies as text or numbers.
+    return int(category_id) if category_id is not None else None
+
+
+class QuestionStats(object):
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._counts = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        rows = db.session.query(Question.category, func.count(Question.id)).\
+            group_by(Question.category).all()
+        self._counts = dict(rows)
+        self._loaded_at = time.monotonic()
+
+    def _current(self):
+        # Callers hold the lock: _shift updates the dict in place.
+        if self._counts is None or \
+                time.monotonic() - self._loaded_at > self.ttl:
+            self._load()
+        return self._counts
+
+    def total(self):
+        with self._lock:
+            return sum(self._current().values())
+
+    def in_category(self, category_id):
+        key = _category_key(category_id)
+        with self._lock:
+            return self._current().get(key, 0)
+
+    def added(self, category_id):
+        self._shift(category_id, 1)
+
+    def deleted(self, category_id):
+        self._shift(category_id, -1)
+
+    def _shift(self, category_id, delta):
+        with self._lock:
+            if self._counts is not None:
+                key = _category_key(category_id)
+                self._counts[key] = self._counts.get(key, 0) + delta
+
+    def invalidate(self):
+        with self._lock:
+            self._counts = None
+
+
+question_stats = QuestionStats()
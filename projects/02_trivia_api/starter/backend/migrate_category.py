@@ -0,0 +1,105 @@
+'''
+Moves questions.category to an indexed integer foreign key to categories.
+
+Databases created while the model declared the column as a String keep
+comparing it as text, with no index, until this runs against them:
+
+    $ python migrate_category.py [database url] [--batch-size 10000]
+
+Every step checks what is already there, so it is safe to rerun, and a
+database restored from trivia.psql (already integer, with the foreign key)
+only gets the index. Text categories are copied into a new integer column
+in batches of primary keys, each committed on its own, so writers are
+only held up by the final swap. Categories that are not a number or point
+at no category become NULL, as ON DELETE SET NULL would have left them.
+'''
+import argparse
+import time
+
+from sqlalchemy import create_engine
+
+from models import database_path
+
+INDEX_NAME = 'ix_questions_category'
+
+CONVERT = '''
+    UPDATE questions SET category_id = categories.id
+    FROM categories
+    WHERE questions.category ~ '^[0-9]+$'
+    AND categories.id = questions.category::integer
+    {}
+'''
+
+
+def category_type(connection):
+    return connection.scalar(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = 'questions' AND column_name = 'category'")
+
+
+def has_foreign_key(connection):
+    return connection.scalar('''
+        SELECT count(*) FROM pg_constraint
+        JOIN pg_attribute ON attrelid = conrelid AND attnum = ANY (conkey)
+        WHERE conrelid = 'questions'::regclass AND contype = 'f'
+        AND attname = 'category'
+    ''') > 0
+
+
+def backfill(engine, batch_size, log):
+    with engine.begin() as connection:
+        connection.execute('ALTER TABLE questions ADD COLUMN IF NOT EXISTS category_id integer')
+        last_id = connection.scalar('SELECT coalesce(max(id), 0) FROM questions')
+
+    start = time.perf_counter()
+    for low in range(0, last_id + 1, batch_size):
+        with engine.begin() as connection:
+            connection.execute(CONVERT.format('AND questions.id >= %s AND questions.id < %s'),
+                               (low, low + batch_size))
+        log('converted ids up to %d of %d' % (min(low + batch_size, last_id), last_id))
+    log('backfill took %.1fs' % (time.perf_counter() - start))
+
+    with engine.begin() as connection:
+        # Rows written during the backfill are caught up under the lock the
+        # swap needs anyway.
+        connection.execute('LOCK TABLE questions IN ACCESS EXCLUSIVE MODE')
+        connection.execute(CONVERT.format('AND questions.category_id IS NULL'))
+        connection.execute('ALTER TABLE questions DROP COLUMN category')
+        connection.execute('ALTER TABLE questions RENAME COLUMN category_id TO category')
+    log('questions.category is now an integer')
+
+
+def migrate(engine, batch_size=10000, log=print):
+    with engine.connect() as connection:
+        data_type = category_type(connection)
+    if data_type is None:
+        raise RuntimeError('questions.category does not exist')
+
+    if data_type != 'integer':
+        backfill(engine, batch_size, log)
+
+    with engine.connect() as connection:
+        if not has_foreign_key(connection):
+            # NOT VALID takes the constraint without a scan under lock,
+            # VALIDATE then checks the rows without blocking writes.
+            with connection.begin():
+                connection.execute(
+                    'ALTER TABLE questions ADD CONSTRAINT questions_category_fkey '
+                    'FOREIGN KEY (category) REFERENCES categories (id) '
+                    'ON UPDATE CASCADE ON DELETE SET NULL NOT VALID')
+            with connection.begin():
+                connection.execute('ALTER TABLE questions VALIDATE CONSTRAINT questions_category_fkey')
+            log('added the foreign key to categories')
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS {} '
+                           'ON questions (category, id)'.format(INDEX_NAME))
+    log('indexed questions.category')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrate questions.category to an integer foreign key.')
+    parser.add_argument('database', nargs='?', default=database_path)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+    migrate(create_engine(args.database), args.batch_size)
@@ -0,0 +1,25 @@
+'''
+Adds the full-text search column and index question search runs on.
+
+Run once against every PostgreSQL database the app uses, after restoring
+trivia.psql or running migrate_category.py:
+
+    $ python migrate_search.py [database url]
+
+It adds questions.search_vector as a generated column, which needs
+PostgreSQL 12 or later, and its GIN index. Both steps check what is
+already there, so it is safe to rerun. Adding the column rewrites the
+table, which is why the app does not do it at startup.
+'''
+import argparse
+
+from sqlalchemy import create_engine
+
+from models import database_path, setup_question_search
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add the question full-text search column and index.')
+    parser.add_argument('database', nargs='?', default=database_path)
+    args = parser.parse_args()
+    setup_question_search(create_engine(args.database))
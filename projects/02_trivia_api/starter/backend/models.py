@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, ForeignKey, Index, create_engine, inspect
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -20,6 +20,49 @@ def setup_db(app, database_path=database_path):
     db.init_app(app)
     db.create_all()
 
+'''
+setup_question_search(engine)
+    adds questions.search_vector, a tsvector of the question (weight A)
+    and answer (weight B) kept current by PostgreSQL itself as a generated
+    column (PostgreSQL 12+), and the GIN index full-text search runs on.
+    It is not mapped on Question: only the search backend reads it.
+    migrate_search.py runs it; the app never alters tables at startup.
+
+    the 'simple' configuration neither stems words nor drops stopwords, so
+    a search for "what" or "the" matches the way the in-memory backend
+    does. A column generated with another configuration is rebuilt.
+'''
+
+SEARCH_CONFIG = 'simple'
+
+SEARCH_VECTOR_EXPRESSION = '''
+    SELECT pg_get_expr(d.adbin, d.adrelid)
+    FROM pg_attrdef d
+    JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum
+    WHERE d.adrelid = 'questions'::regclass AND a.attname = 'search_vector'
+'''
+
+
+def setup_question_search(engine):
+    columns = [column['name'] for column in inspect(engine).get_columns('questions')]
+    with engine.begin() as connection:
+        if 'search_vector' in columns:
+            expression = connection.execute(SEARCH_VECTOR_EXPRESSION).scalar()
+            if "'{}'".format(SEARCH_CONFIG) not in (expression or ''):
+                # Dropping the column drops its index with it.
+                connection.execute("ALTER TABLE questions DROP COLUMN search_vector")
+                columns.remove('search_vector')
+        if 'search_vector' not in columns:
+            connection.execute(
+                "ALTER TABLE questions ADD COLUMN search_vector tsvector "
+                "GENERATED ALWAYS AS ("
+                "setweight(to_tsvector('{0}', coalesce(question, '')), 'A') || "
+                "setweight(to_tsvector('{0}', coalesce(answer, '')), 'B')"
+                ") STORED".format(SEARCH_CONFIG))
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_questions_search_vector "
+            "ON questions USING gin (search_vector)")
+
 '''
 Question
 
@@ -28,11 +71,14 @@ Question
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    # Category listings filter on category and page by id.
+    __table_args__ = (Index('ix_questions_category', 'category', 'id'),)
 
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE',
+                                          ondelete='SET NULL'))
     difficulty = Column(Integer)
 
     def __init__(self, question, answer, category, difficulty):
@@ -61,6 +107,23 @@ class Question(db.Model):
             'difficulty': self.difficulty
         }
 
+    '''
+    format_columns() / format_row(row)
+        the columns format() reads, and the same dict built from a row of
+        them. List endpoints select these with query.with_entities() and
+        map the tuples straight to dicts, without building a Question (and
+        its identity map entry and attribute state) per row.
+    '''
+    FORMAT_FIELDS = ('id', 'question', 'answer', 'category', 'difficulty')
+
+    @classmethod
+    def format_columns(cls):
+        return [getattr(cls, field) for field in cls.FORMAT_FIELDS]
+
+    @classmethod
+    def format_row(cls, row):
+        return dict(zip(cls.FORMAT_FIELDS, row))
+
 '''
 Category
 
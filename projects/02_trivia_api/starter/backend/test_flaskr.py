@@ -1,10 +1,12 @@
 import os
+import gzip
 import unittest
 import json
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr.encoding import compress
+from models import setup_db, db, Question, Category
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -28,8 +30,8 @@ class TriviaTestCase(unittest.TestCase):
             self.db.create_all()
 
         self.new_question = {
-            'question': 'What year was the first model
-            of the iPhone released?',
+            'question': 'What year was the first model '
+                        'of the iPhone released?',
             'answer': '2007',
             'category': 4,
             'difficulty': 1
@@ -70,6 +72,53 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'ressource not found')
 
+    def test_get_questions_after_cursor(self):
+        first = json.loads(self.client().get('/questions?limit=5').data)
+        res = self.client().get('/questions?limit=5&after={}'.format(
+            first['nextCursor']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(len(data['questions']), 5)
+        self.assertTrue(data['questions'][0]['id'] >
+                        first['questions'][-1]['id'])
+
+    def test_400_questions_with_invalid_cursor(self):
+        res = self.client().get('/questions?after=not-a-cursor')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_get_questions_gzip_compressed(self):
+        res = self.client().get('/questions',
+                                headers={'Accept-Encoding': 'gzip'})
+        data = json.loads(gzip.decompress(res.data))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        self.assertEqual(data['success'], True)
+
+    def test_small_response_not_compressed(self):
+        res = self.client().get('/quiz/sessions/not-a-session/next',
+                                headers={'Accept-Encoding': 'gzip'})
+
+        self.assertNotIn('Content-Encoding', res.headers)
+        self.assertEqual(json.loads(res.data)['success'], False)
+
+    def test_response_without_length_not_compressed(self):
+        response = self.app.response_class('{}' * 1000,
+                                           mimetype='application/json')
+        del response.headers['Content-Length']
+        with self.app.test_request_context(
+                headers={'Accept-Encoding': 'gzip'}):
+            response = compress(response)
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_data(as_text=True), '{}' * 1000)
+
     def test_get_categories(self):
         res = self.client().get('/categories')
         data = json.loads(res.data)
@@ -77,6 +126,14 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
 
+    def test_get_categories_not_modified(self):
+        first = self.client().get('/categories')
+        res = self.client().get('/categories', headers={
+            'If-None-Match': first.headers['ETag']})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertIn('max-age', first.headers['Cache-Control'])
+
     def test_create_new_question(self):
         res = self.client().post('/questions/add', json=self.new_question)
         data = json.loads(res.data)
@@ -85,6 +142,64 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['created'])
 
+    def test_bulk_create_questions(self):
+        rows = [
+            self.new_question,
+            dict(self.new_question, category=1000),
+            dict(self.new_question, answer='')
+        ]
+        res = self.client().post(
+            '/questions/bulk',
+            data='\n'.join(json.dumps(row) for row in rows) + '\nnot json\n',
+            content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['rejected'], 3)
+        self.assertEqual([error['line'] for error in data['errors']], [2, 3, 4])
+        self.assertIn('category', data['errors'][0]['errors'])
+
+    def test_bulk_create_questions_rejects_chunk_database_refuses(self):
+        self.app.config['INGEST_CHUNK_SIZE'] = 1
+        total = json.loads(self.client().get('/questions').data)['totalQuestions']
+        rows = [
+            self.new_question,
+            dict(self.new_question, question='Null\x00byte')
+        ]
+        res = self.client().post(
+            '/questions/bulk',
+            data='\n'.join(json.dumps(row) for row in rows),
+            content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['rejected'], 1)
+        self.assertEqual(data['errors'][0]['line'], 2)
+        self.assertIn('database', data['errors'][0]['errors'])
+        self.assertEqual(json.loads(self.client().get('/questions').data)
+                         ['totalQuestions'], total + 1)
+
+    def test_bulk_create_questions_from_csv(self):
+        res = self.client().post(
+            '/questions/bulk?format=csv',
+            data='question,answer,category,difficulty\n'
+                 '"Who painted ""Guernica""?",Picasso,2,2\n')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['rejected'], 0)
+
+    def test_400_bulk_create_questions_without_format(self):
+        res = self.client().post('/questions/bulk', data='{}')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
     def test_delete_question(self):
         res = self.client().delete('/questions/12')
         data = json.loads(res.data)
@@ -108,7 +223,46 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
         self.assertTrue(len(data['questions']))
-        self.assertEqual(len(data['questions']), 2)
+        self.assertEqual(len(data['questions']), 1)
+        self.assertEqual(data['totalQuestions'], 1)
+
+    def test_search_stopwords_like_memory_backend(self):
+        def search(term):
+            data = json.loads(self.client().post(
+                '/questions', json={'searchTerm': term}).data)
+            return data['totalQuestions'], \
+                sorted(question['id'] for question in data['questions'])
+
+        for term in ('what', 'the title', 'Whose'):
+            found = search(term)
+            self.app.config['SEARCH_BACKEND'] = 'memory'
+            self.assertEqual(found, search(term))
+            self.app.config.pop('SEARCH_BACKEND')
+            self.assertTrue(found[0])
+
+    def test_search_questions_in_category(self):
+        science = Question('What pigment makes chlorophyll plants green?',
+                           'Chlorophyll', 1, 2)
+        art = Question('Which painter mixed chlorophyll into his greens?',
+                       'Nobody', 2, 4)
+        science.insert()
+        art.insert()
+        science_id, art_id = science.id, art.id
+        try:
+            res = self.client().post('/questions', json={
+                'searchTerm': "chlorophyll", 'category': 1})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['success'], True)
+            self.assertEqual([question['id'] for question in data['questions']],
+                             [science_id])
+            self.assertEqual(data['totalQuestions'], 1)
+            self.assertEqual(data['currentCategory'], 'Science')
+        finally:
+            Question.query.filter(Question.id.in_([science_id, art_id])).\
+                delete(synchronize_session=False)
+            db.session.commit()
 
     def test_list_questions_from_category(self):
         res = self.client().get('/categories/3/questions')
@@ -144,6 +298,43 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['question']['id'] not in
                         self.quiz_data_art['previous_questions'])
 
+    def test_quiz_session_asks_each_question_once(self):
+        res = self.client().post('/quiz/sessions', json={
+            'quiz_category': self.quiz_data_art['quiz_category']})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+
+        asked = []
+        for _ in range(data['totalQuestions'] + 1):
+            res = self.client().get(
+                '/quiz/sessions/{}/next'.format(data['session']))
+            question = json.loads(res.data).get('question')
+            if question is None:
+                break
+            self.assertEqual(question['category'], 2)
+            asked.append(question['id'])
+
+        self.assertEqual(len(asked), data['totalQuestions'])
+        self.assertEqual(len(set(asked)), len(asked))
+
+    def test_404_quiz_session_of_unknown_category(self):
+        res = self.client().post('/quiz/sessions', json={
+            'quiz_category': {'type': 'Nothing', 'id': 1000}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_404_next_question_of_unknown_quiz_session(self):
+        res = self.client().get('/quiz/sessions/not-a-session/next')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
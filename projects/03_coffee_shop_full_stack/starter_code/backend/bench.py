@@ -0,0 +1,159 @@
+'''
+Benchmarks for the coffee shop auth path and drink routes.
+
+Tokens are signed by the in-memory test signer (AUTH_KEYS=test), so
+nothing reaches Auth0, and the drinks go to a scratch SQLite database
+unless DATABASE_URL is set. Run from the backend directory:
+
+    $ python bench.py [name ...]
+'''
+import os
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+# Both are read when src is imported.
+os.environ['AUTH_KEYS'] = 'test'
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(), 'bench.db'))
+
+from flask import Flask
+
+from src.auth import auth
+
+MANAGER = ['get:drinks-detail', 'post:drinks', 'patch:drinks', 'delete:drinks']
+
+
+def bench_auth(rounds=200):
+    '''
+    Times requires_auth on one token, verifying the signature every call
+    and then through the verified-token cache. The cached call must be at
+    least ten times faster.
+    '''
+    token = auth.key_provider.sign(['get:drinks-detail'])
+    view = auth.requires_auth('get:drinks-detail')(lambda payload: payload)
+
+    app = Flask(__name__)
+    with app.test_request_context(headers={'Authorization': 'Bearer ' + token}):
+        view()
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            auth.verified_tokens.clear()
+            view()
+        verify = (time.perf_counter() - start) / rounds
+
+        auth.verified_tokens.clear()
+        start = time.perf_counter()
+        for _ in range(rounds * 100):
+            view()
+        cached = (time.perf_counter() - start) / (rounds * 100)
+
+    print('%-10s %10.1f us/request' % ('verify', verify * 1e6))
+    print('%-10s %10.1f us/request' % ('cached', cached * 1e6))
+    print(auth.verified_tokens.stats())
+    return cached * 10 < verify
+
+
+Route = namedtuple('Route', ['name', 'method', 'path', 'body'])
+
+
+def bench_routes(requests=500):
+    '''
+    Load tests the authenticated drink routes in process with a manager
+    token: creates requests drinks, lists them, renames and deletes each.
+    Every request must succeed.
+    '''
+    from src.api import app
+
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + auth.key_provider.sign(MANAGER)}
+    recipe = {'name': 'milk', 'color': 'grey', 'parts': 1}
+
+    def run(route, items):
+        failures = 0
+        start = time.perf_counter()
+        for item in items:
+            response = client.open(route.path.format(item), method=route.method,
+                                   json=route.body(item) if route.body else None,
+                                   headers=headers)
+            failures += response.status_code != 200
+        elapsed = time.perf_counter() - start
+        print('%-18s %8d %10.2f %10.0f %8d' % (
+            route.name, len(items), elapsed * 1000 / len(items),
+            len(items) / elapsed, failures))
+        return failures == 0
+
+    print('%-18s %8s %10s %10s %8s' % ('route', 'requests', 'ms/req', 'req/s', 'failed'))
+    ok = run(Route('POST /drinks', 'POST', '/drinks',
+                   lambda i: {'title': 'Drink %d' % i, 'recipe': recipe}),
+             range(requests))
+    ids = [drink['id'] for drink in client.get('/drinks-detail', headers=headers)
+           .get_json()['drinks']]
+    ok = run(Route('GET /drinks', 'GET', '/drinks', None),
+             range(requests // 10)) and ok
+    ok = run(Route('GET /drinks-detail', 'GET', '/drinks-detail', None),
+             range(requests // 10)) and ok
+    ok = run(Route('PATCH /drinks', 'PATCH', '/drinks/{}',
+                   lambda i: {'title': 'Renamed %d' % i}), ids) and ok
+    ok = run(Route('DELETE /drinks', 'DELETE', '/drinks/{}', None), ids) and ok
+    return ok
+
+
+def legacy_check_permissions(permission, payload):
+    '''What check_permissions used to do: a scan of the claim's list.'''
+    return permission in payload['permissions']
+
+
+def bench_permissions(sizes=(10, 1000, 10000), rounds=20000):
+    '''
+    Checks a route needing two of a token's permissions, the last two it
+    lists, by scanning the claim and with the compiled requirement against
+    the cached frozenset. The compiled check must not grow with the claim.
+    '''
+    requirement = auth.compile_permissions(['post:drinks', 'patch:drinks'])
+    timings = []
+
+    print('%12s %-10s %10s' % ('permissions', 'check', 'us/check'))
+    for size in sizes:
+        permissions = ['scope:%d' % i for i in range(size - 2)] + ['post:drinks', 'patch:drinks']
+        payload = {'permissions': permissions}
+        granted = frozenset(permissions)
+
+        for label, check in (
+                ('list', lambda: all(legacy_check_permissions(p, payload)
+                                     for p in ('post:drinks', 'patch:drinks'))),
+                ('compiled', lambda: auth.check_permissions(requirement, payload, granted))):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                check()
+            elapsed = (time.perf_counter() - start) * 1e6 / rounds
+            print('%12d %-10s %10.3f' % (size, label, elapsed))
+        timings.append(elapsed)
+
+    return timings[-1] < timings[0] * 2
+
+
+# Nothing here touches Auth0 or the app's own database, so every benchmark
+# is safe to run anywhere.
+BENCHMARKS = {
+    'auth': (bench_auth, 'the verified-token cache is not ten times faster than verifying'),
+    'permissions': (bench_permissions, 'compiled permission checks grow with the permissions claim'),
+    'routes': (bench_routes, 'an authenticated drink route failed'),
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    failures = []
+    for name in names:
+        bench, failure = BENCHMARKS[name]
+        print('\n# ' + name)
+        if not bench():
+            failures.append(failure)
+
+    for failure in failures:
+        print('FAIL: ' + failure)
+    if failures:
+        sys.exit(1)
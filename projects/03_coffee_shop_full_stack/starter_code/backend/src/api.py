@@ -28,12 +28,7 @@ def index():
     })
 @app.route('/drinks')
 def view_drink():
-    selection = Drink.query.all()
-
-    if selection is None:
-        abort(404)
-
-    drinks = [drink.short() for drink in selection]
+    drinks = Drink.list_short()
     return jsonify({
         'success': True,
         'drinks': drinks
@@ -43,12 +38,7 @@ def view_drink():
 @app.route('/drinks-detail')
 @requires_auth('get:drinks-detail')
 def view_drink_detail(payload):
-    selection = Drink.query.all()
-
-    if selection is None:
-        abort(404)
-
-    drinks = [drink.long() for drink in selection]
+    drinks = Drink.list_long()
     return jsonify({
         'success': True,
         'drinks': drinks
@@ -63,7 +53,7 @@ def create_drink(payload):
     recipe = body.get('recipe')
 
     try:
-        new_drink = Drink(title=title, recipe=json.dumps([recipe]))
+        new_drink = Drink(title=title, recipe=recipe)
 
         db.session.add(new_drink)
         db.session.commit()
@@ -93,7 +83,7 @@ def modify_drinks(payload, drink_id):
             drink.title = body.get('title')
 
         if 'recipe' in body:
-            drink.recipe = json.dumps(body.get('recipe'))
+            drink.recipe = body.get('recipe')
 
         drink.update()
 
@@ -1,13 +1,32 @@
 import json
+import os
+from collections import namedtuple
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
 
+from .keys import make_key_provider
+from .token_cache import TokenCache
+from .permissions import all_of, any_of, compile_permissions
 
-AUTH0_DOMAIN = 'panchob.auth0.com'
+
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', 'panchob.auth0.com')
 ALGORITHMS = ['RS256']
-API_AUDIENCE = 'Coffee'
+API_AUDIENCE = os.environ.get('API_AUDIENCE', 'Coffee')
+
+# The keys tokens are verified against, set up once at import: the
+# tenant's JWKS unless AUTH_KEYS names a local file or 'test'; see keys.py.
+key_provider = make_key_provider(
+    os.environ.get('AUTH_KEYS'),
+    f'https://{AUTH0_DOMAIN}/.well-known/jwks.json',
+    issuer='https://' + AUTH0_DOMAIN + '/',
+    audience=API_AUDIENCE)
+# Tokens already verified, until they expire; see token_cache.py.
+verified_tokens = TokenCache()
+
+# A verified payload with its permissions claim as a frozenset, or None
+# when the token has no such claim.
+VerifiedToken = namedtuple('VerifiedToken', ['payload', 'permissions'])
 
 # AuthError Exception
 '''
@@ -56,14 +75,21 @@ def get_token_auth_header():
     return token
 
 
-def check_permissions(permission, payload):
+def check_permissions(permission, payload, granted=None):
+    '''
+    permission is a permission string or a requirement of permissions.py.
+    granted is the payload's permissions as a frozenset, when the caller
+    already has it.
+    '''
     if 'permissions' not in payload:
         raise AuthError({
             'code': 'invalid_claims',
             'description': 'Permissions not included in JWT.'
          }, 400)
 
-    if permission not in payload['permissions']:
+    if granted is None:
+        granted = frozenset(payload['permissions'])
+    if not compile_permissions(permission)(granted):
         raise AuthError({
             'code': 'unauthorize',
             'description': 'Permission not found'
@@ -72,25 +98,14 @@ def check_permissions(permission, payload):
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = key_provider.get(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -126,14 +141,32 @@ def verify_decode_jwt(token):
             }, 400)
 
 
+def verify_token(token):
+    '''verify_decode_jwt, through the verified_tokens cache.'''
+    verified = verified_tokens.get(token)
+    if verified is None:
+        payload = verify_decode_jwt(token)
+        permissions = payload.get('permissions')
+        verified = VerifiedToken(
+            payload, frozenset(permissions) if permissions is not None else None)
+        verified_tokens.put(token, verified, payload.get('exp'))
+    return verified
+
+
 def requires_auth(permission=''):
+    '''
+    permission is a permission string, a list of them that are all
+    needed, or an all_of() / any_of() requirement; see permissions.py.
+    '''
+    requirement = compile_permissions(permission)
+
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
-            return f(payload, *args, **kwargs)
+            verified = verify_token(token)
+            check_permissions(requirement, verified.payload, verified.permissions)
+            return f(verified.payload, *args, **kwargs)
 
         return wrapper
     return requires_auth_decorator
@@ -0,0 +1,143 @@
+import json
+import logging
+import threading
+import time
+from urllib.request import urlopen
+
+from werkzeug.http import parse_cache_control_header
+
+logger = logging.getLogger(__name__)
+
+'''
+JWKSKeyStore
+    the signing keys of a JSON Web Key Set URL, held in memory by kid
+
+    keys are fetched by load() at startup, or else on first use, and kept
+    for the max-age of the response's Cache-Control header
+    (default_max_age without one). Past
+    refresh_ahead of that lifetime the next lookup starts a refresh on a
+    background thread, so requests keep being served from the current keys
+    while it runs. A kid that is not in the set triggers one synchronous
+    refetch, at most every min_refetch_interval seconds, in case the
+    identity provider rotated its keys. If a refetch fails the keys
+    already held are kept; if load() fails it raises.
+
+    EXAMPLE
+        jwks = JWKSKeyStore('https://tenant.auth0.com/.well-known/jwks.json')
+        key = jwks.get(jwt.get_unverified_header(token)['kid'])
+'''
+
+
+class JWKSKeyStore(object):
+
+    def __init__(self, url, default_max_age=600, refresh_ahead=0.8,
+                 min_refetch_interval=30, timeout=5):
+        self.url = url
+        self.default_max_age = default_max_age
+        self.refresh_ahead = refresh_ahead
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+
+        self._keys = {}
+        self._fetched_at = None
+        self._refresh_at = 0
+        self._last_attempt = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def get(self, kid):
+        '''The key dict of kid, or None when the set does not have it.'''
+        if self._fetched_at is not None and time.monotonic() >= self._refresh_at:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and self._may_refetch():
+            self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def _may_refetch(self):
+        with self._lock:
+            return self._last_attempt is None or \
+                time.monotonic() - self._last_attempt >= self.min_refetch_interval
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def refresh(self):
+        # Threads that arrive while a fetch runs wait for it rather than
+        # fetching again.
+        attempt = time.monotonic()
+        with self._fetch_lock:
+            if self._last_attempt is not None and self._last_attempt >= attempt:
+                with self._lock:
+                    self._refreshing = False
+                return
+            try:
+                keys, max_age = self.fetch()
+            except Exception as error:
+                logger.warning('could not fetch %s (%s), keeping %d keys',
+                               self.url, error, len(self._keys))
+                with self._lock:
+                    self._last_attempt = time.monotonic()
+                    self._refresh_at = self._last_attempt + self.min_refetch_interval
+                    self._refreshing = False
+                return
+
+            self._set_keys(keys, max_age)
+
+    def load(self):
+        '''
+        Fetches the keys now, for startup: unlike refresh(), a fetch that
+        fails raises instead of leaving the store empty.
+        '''
+        with self._fetch_lock:
+            keys, max_age = self.fetch()
+            self._set_keys(keys, max_age)
+
+    def _set_keys(self, keys, max_age):
+        now = time.monotonic()
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = now
+            self._last_attempt = now
+            self._refresh_at = now + max(max_age * self.refresh_ahead,
+                                         self.min_refetch_interval)
+            self._refreshing = False
+
+    def fetch(self):
+        '''Returns ({kid: key}, max-age in seconds) from the URL.'''
+        with urlopen(self.url, timeout=self.timeout) as response:
+            jwks = json.loads(response.read())
+            cache_control = parse_cache_control_header(
+                response.headers.get('Cache-Control'))
+
+        max_age = cache_control.max_age
+        if cache_control.no_store or cache_control.no_cache:
+            max_age = 0
+        elif max_age is None:
+            max_age = self.default_max_age
+        return keys_by_kid(jwks), max_age
+
+
+def _is_rsa_signing_key(key):
+    # A set may also publish EC or encryption keys, or keys without a kid;
+    # none of them can verify an RS256 token, so they are left out.
+    return key.get('kty') == 'RSA' and key.get('use', 'sig') == 'sig' and \
+        all(name in key for name in ('kid', 'n', 'e'))
+
+
+def keys_by_kid(jwks):
+    '''The RSA signing keys of a parsed JWKS document, by kid.'''
+    return {key['kid']: {
+        'kty': key['kty'],
+        'kid': key['kid'],
+        'use': key.get('use', 'sig'),
+        'n': key['n'],
+        'e': key['e']
+    } for key in jwks.get('keys', []) if _is_rsa_signing_key(key)}
@@ -0,0 +1,105 @@
+import base64
+import json
+import time
+
+from jose import jwt
+
+from .jwks import JWKSKeyStore, keys_by_kid
+
+'''
+Key providers for verify_decode_jwt. Each has get(kid), the key a token
+signed under kid verifies against, or None when it has none.
+
+    JWKSKeyStore   the identity provider's JWKS URL, cached by kid (jwks.py)
+    LocalKeys      a JWKS or PEM public key file, read once at startup
+    TestSigner     an RSA key pair made in memory at startup, which also
+                   signs tokens: for tests, load tests and offline staging
+
+make_key_provider(spec, jwks_url, issuer, audience) builds the one the
+AUTH_KEYS environment variable names, with its keys already loaded:
+
+    unset or ''        JWKSKeyStore(jwks_url)
+    'https://...'      JWKSKeyStore of that URL
+    'test'             TestSigner(issuer, audience)
+    a file path        LocalKeys of that file (.pem or JWKS .json)
+
+    EXAMPLE
+        $ AUTH_KEYS=/etc/coffee/jwks.json flask run
+'''
+
+
+class LocalKeys(object):
+    '''
+    The keys of a JWKS file by kid, or the single key of a PEM file. A PEM
+    key answers for kid, or for every kid when kid is None.
+    '''
+
+    def __init__(self, path, kid=None):
+        self.path = path
+        self.kid = kid
+        with open(path) as key_file:
+            data = key_file.read()
+        if data.lstrip().startswith('-----BEGIN'):
+            self._pem = data
+            self._keys = {}
+        else:
+            self._pem = None
+            self._keys = keys_by_kid(json.loads(data))
+
+    def get(self, kid):
+        if self._pem is not None:
+            return self._pem if self.kid is None or kid == self.kid else None
+        return self._keys.get(kid)
+
+
+def _b64_int(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+class TestSigner(object):
+    '''
+    A throwaway RSA key pair. get(kid) serves its public half, sign()
+    makes RS256 tokens with it that verify_decode_jwt accepts.
+    '''
+
+    def __init__(self, issuer, audience, kid='test', bits=2048):
+        # Only this provider needs to make keys.
+        from Crypto.PublicKey import RSA
+
+        self.issuer = issuer
+        self.audience = audience
+        self.kid = kid
+        key = RSA.generate(bits)
+        self._private_pem = key.exportKey('PEM').decode()
+        self.public_key = {'kty': 'RSA', 'kid': kid, 'use': 'sig',
+                           'n': _b64_int(key.n), 'e': _b64_int(key.e)}
+
+    def get(self, kid):
+        return self.public_key if kid == self.kid else None
+
+    def sign(self, permissions=(), ttl=3600, **claims):
+        now = int(time.time())
+        claims.setdefault('sub', 'test')
+        claims.update(iss=self.issuer, aud=self.audience, iat=now,
+                      exp=now + ttl, permissions=list(permissions))
+        return jwt.encode(claims, self._private_pem, algorithm='RS256',
+                          headers={'kid': self.kid})
+
+
+def _loaded_jwks(url):
+    # Fetched now so the first request does not wait on the identity
+    # provider, and a wrong URL stops the app from starting.
+    store = JWKSKeyStore(url)
+    store.load()
+    return store
+
+
+def make_key_provider(spec, jwks_url, issuer, audience):
+    if not spec:
+        return _loaded_jwks(jwks_url)
+    if spec.startswith(('https://', 'http://')):
+        return _loaded_jwks(spec)
+    if spec == 'test':
+        return TestSigner(issuer, audience)
+    return LocalKeys(spec)
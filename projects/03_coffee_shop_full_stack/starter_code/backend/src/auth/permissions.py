@@ -0,0 +1,59 @@
+'''
+all_of(*requirements) / any_of(*requirements)
+    permission requirements for requires_auth, made of permission strings
+    and other requirements
+
+    a requirement is compiled once, when requires_auth decorates the
+    route: its permission strings become a frozenset, so checking a
+    token's granted permissions (a frozenset as well) is a subset or
+    disjointness test whose cost depends on the route, not on how many
+    permissions the token carries. A plain string is all_of that one
+    permission; a list or tuple is all_of its items.
+
+    EXAMPLE
+        @requires_auth(any_of('patch:drinks', all_of('delete:drinks', 'post:drinks')))
+'''
+
+
+class AllOf(object):
+
+    def __init__(self, *requirements):
+        self.permissions = frozenset(
+            r for r in requirements if isinstance(r, str))
+        self.nested = tuple(
+            compile_permissions(r) for r in requirements if not isinstance(r, str))
+
+    def __call__(self, granted):
+        return self.permissions <= granted and \
+            all(requirement(granted) for requirement in self.nested)
+
+    def __repr__(self):
+        return 'all_of({})'.format(', '.join(
+            [repr(p) for p in sorted(self.permissions)] + [repr(r) for r in self.nested]))
+
+
+class AnyOf(AllOf):
+
+    def __call__(self, granted):
+        return not self.permissions.isdisjoint(granted) or \
+            any(requirement(granted) for requirement in self.nested)
+
+    def __repr__(self):
+        return 'any' + super(AnyOf, self).__repr__()[3:]
+
+
+all_of = AllOf
+any_of = AnyOf
+
+
+def compile_permissions(requirement):
+    '''An AllOf or AnyOf for requirement; '' or None requires nothing.'''
+    if isinstance(requirement, AllOf):
+        return requirement
+    if requirement is None or requirement == '':
+        return AllOf()
+    if isinstance(requirement, str):
+        return AllOf(requirement)
+    if isinstance(requirement, (list, tuple)):
+        return AllOf(*requirement)
+    raise TypeError('not a permission requirement: {!r}'.format(requirement))
@@ -0,0 +1,79 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+'''
+TokenCache
+    payloads of tokens that already passed verify_decode_jwt, so a client
+    sending the same bearer token again skips the RS256 signature check
+
+    entries are keyed by the SHA-256 of the token (the raw tokens are not
+    held), kept until the token's exp claim and evicted least recently used
+    past maxsize. Tokens without exp are not cached. hits and misses count
+    the lookups since the last clear().
+
+    EXAMPLE
+        verified = verified_tokens.get(token)
+        if verified is None:
+            payload = verify_decode_jwt(token)
+            verified = VerifiedToken(payload, ...)
+            verified_tokens.put(token, verified, payload.get('exp'))
+'''
+
+
+class TokenCache(object):
+
+    def __init__(self, maxsize=1024, clock=time.time):
+        self.maxsize = maxsize
+        # exp is wall clock time, so is the clock.
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                exp, value = entry
+                if self.clock() < exp:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token, value, exp):
+        if not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (exp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
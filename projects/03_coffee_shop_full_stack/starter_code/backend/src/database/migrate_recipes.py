@@ -0,0 +1,65 @@
+'''
+Moves drink recipes from the JSON blob in drink.recipe to ingredient rows.
+
+Run from the backend directory against a database created while Drink
+still had the recipe column:
+
+    $ python -m src.database.migrate_recipes [database url]
+
+Each drink's blob becomes one ingredient row per item, in order. Blobs
+written by the old POST /drinks, which wrapped the recipe in a second list,
+are flattened. Every drink is converted in one transaction that also drops
+the recipe column, so the script can be rerun after a failure; once the
+column is gone there is nothing left to do. Dropping a column needs
+SQLite 3.35 or later.
+'''
+import argparse
+import json
+
+from sqlalchemy import create_engine, inspect
+
+from .models import database_path, Ingredient
+
+
+def _flatten(items):
+    for item in items:
+        if isinstance(item, list):
+            yield from _flatten(item)
+        else:
+            yield item
+
+
+def ingredients_of(recipe):
+    '''The ingredient dicts of a recipe blob, nested lists flattened.'''
+    items = json.loads(recipe) if recipe else []
+    return list(_flatten([items] if isinstance(items, dict) else items))
+
+
+def migrate(engine, log=print):
+    if 'recipe' not in [column['name'] for column in inspect(engine).get_columns('drink')]:
+        log('drink.recipe is already gone')
+        return
+
+    Ingredient.__table__.create(engine, checkfirst=True)
+    table = Ingredient.__table__
+    with engine.begin() as connection:
+        drinks = connection.execute('SELECT id, recipe FROM drink').fetchall()
+        connection.execute(table.delete())
+        rows = []
+        for drink_id, recipe in drinks:
+            for position, item in enumerate(ingredients_of(recipe)):
+                ingredient = Ingredient.from_dict(position, item)
+                rows.append({'drink_id': drink_id, 'position': position,
+                             'name': ingredient.name, 'color': ingredient.color,
+                             'parts': ingredient.parts})
+        if rows:
+            connection.execute(table.insert(), rows)
+        connection.execute('ALTER TABLE drink DROP COLUMN recipe')
+    log('moved the recipes of %d drinks to %d ingredient rows' % (len(drinks), len(rows)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move drink recipes to ingredient rows.')
+    parser.add_argument('database', nargs='?', default=database_path)
+    args = parser.parse_args()
+    migrate(create_engine(args.database))
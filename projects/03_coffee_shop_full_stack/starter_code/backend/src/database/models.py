@@ -1,12 +1,15 @@
 import os
-from sqlalchemy import Column, String, Integer
+from itertools import groupby
+from sqlalchemy import Column, String, Integer, ForeignKey
+from sqlalchemy.orm import relationship
 from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir,
-                                      database_filename))
+database_path = os.environ.get(
+    'DATABASE_URL',
+    "sqlite:///{}".format(os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
@@ -46,23 +49,33 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
-    # the required datatype is [{'color': string, 'name':string,
-    # 'parts':number}]
-    recipe = Column(String(180), nullable=False)
+    # the recipe, one Ingredient row per ingredient in order; read and
+    # written as [{'color': string, 'name':string, 'parts':number}]
+    # through the recipe property
+    ingredients = relationship('Ingredient', order_by='Ingredient.position',
+                               cascade='all, delete-orphan', lazy='selectin')
+
+    @property
+    def recipe(self):
+        return [ingredient.long() for ingredient in self.ingredients]
+
+    @recipe.setter
+    def recipe(self, recipe):
+        # A single ingredient may come without its list.
+        if isinstance(recipe, dict):
+            recipe = [recipe]
+        self.ingredients = [Ingredient.from_dict(position, ingredient)
+                            for position, ingredient in enumerate(recipe)]
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']}
-                        for r in json.loads(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': [ingredient.short() for ingredient in self.ingredients]
         }
 
     '''
@@ -73,9 +86,42 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
+    '''
+    list_short() / list_long()
+        short() and long() of every drink, read with a single query of
+        the columns they need joined to the ingredients, without loading
+        Drink or Ingredient instances
+        EXAMPLE
+            drinks = Drink.list_short()
+    '''
+    @classmethod
+    def list_short(cls):
+        return cls._list(Ingredient.color, Ingredient.parts)
+
+    @classmethod
+    def list_long(cls):
+        return cls._list(Ingredient.color, Ingredient.name, Ingredient.parts)
+
+    @classmethod
+    def _list(cls, *columns):
+        fields = [column.key for column in columns]
+        rows = db.session.query(cls.id, cls.title, *columns).\
+            outerjoin(Ingredient).\
+            order_by(cls.id, Ingredient.position)
+        drinks = []
+        for (id, title), group in groupby(rows, key=lambda row: row[:2]):
+            recipe = [dict(zip(fields, row[2:])) for row in group]
+            drinks.append({
+                'id': id,
+                'title': title,
+                # A drink without ingredients comes back as one NULL row.
+                'recipe': recipe if recipe[0][fields[0]] is not None else []
+            })
+        return drinks
+
     '''
     insert()
         inserts a new model into a database
@@ -115,3 +161,37 @@ class Drink(db.Model):
 
     def __repr__(self):
         return json.dumps(self.short())
+
+
+'''
+Ingredient
+one ingredient of a Drink's recipe, position giving its place in the list
+'''
+
+
+class Ingredient(db.Model):
+    id = Column(Integer, primary_key=True)
+    drink_id = Column(Integer, ForeignKey('drink.id', ondelete='CASCADE'),
+                      nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    name = Column(String(80), nullable=False)
+    color = Column(String(80), nullable=False)
+    parts = Column(Integer, nullable=False)
+
+    '''
+    from_dict(position, ingredient)
+        an Ingredient of a {'color', 'name', 'parts'} dict; raises
+        KeyError, TypeError or ValueError when it is not one
+    '''
+    @classmethod
+    def from_dict(cls, position, ingredient):
+        return cls(position=position,
+                   name=str(ingredient['name']),
+                   color=str(ingredient['color']),
+                   parts=int(ingredient['parts']))
+
+    def short(self):
+        return {'color': self.color, 'parts': self.parts}
+
+    def long(self):
+        return {'color': self.color, 'name': self.name, 'parts': self.parts}
@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from src.auth.jwks import JWKSKeyStore
+
+
+def rsa_key(kid):
+    return {'kty': 'RSA', 'kid': kid, 'use': 'sig', 'n': 'n-' + kid, 'e': 'AQAB'}
+
+
+class StubJWKSServer(object):
+    '''Serves jwks, a JWKS document the test can change, on a local port.'''
+
+    def __init__(self, jwks):
+        self.jwks = jwks
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                body = json.dumps(stub.jwks).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', 'max-age=600')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d/.well-known/jwks.json' % self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JWKSKeyStoreTestCase(unittest.TestCase):
+    """This class represents the JWKS key store test case"""
+
+    def setUp(self):
+        self.stub = StubJWKSServer({'keys': [rsa_key('one'), rsa_key('two')]})
+
+    def tearDown(self):
+        self.stub.close()
+
+    def test_get_key_by_kid(self):
+        store = JWKSKeyStore(self.stub.url)
+
+        self.assertEqual(store.get('two'), rsa_key('two'))
+        self.assertEqual(store.get('one'), rsa_key('one'))
+        self.assertEqual(self.stub.requests, 1)
+
+    def test_unknown_kid_refetches_at_most_once_per_interval(self):
+        store = JWKSKeyStore(self.stub.url, min_refetch_interval=0.5)
+        store.get('one')
+        self.stub.jwks = {'keys': [rsa_key('one'), rsa_key('rotated')]}
+
+        self.assertEqual(store.get('rotated'), None)
+        self.assertEqual(store.get('missing'), None)
+        self.assertEqual(self.stub.requests, 1)
+
+        time.sleep(0.6)
+        self.assertEqual(store.get('rotated'), rsa_key('rotated'))
+        self.assertEqual(self.stub.requests, 2)
+
+    def test_load_fetches_up_front(self):
+        store = JWKSKeyStore(self.stub.url)
+        store.load()
+        self.assertEqual(self.stub.requests, 1)
+
+        self.assertEqual(store.get('one'), rsa_key('one'))
+        self.assertEqual(self.stub.requests, 1)
+
+    def test_load_raises_when_the_url_fails(self):
+        store = JWKSKeyStore(self.stub.url + '.missing', timeout=1)
+        self.stub.close()
+
+        with self.assertRaises(OSError):
+            store.load()
+
+    def test_skips_keys_that_cannot_verify_rs256(self):
+        self.stub.jwks = {'keys': [
+            {'kty': 'EC', 'kid': 'ec', 'crv': 'P-256', 'x': 'x', 'y': 'y'},
+            dict(rsa_key('encryption'), use='enc'),
+            {'kty': 'RSA', 'kid': 'incomplete', 'e': 'AQAB'},
+            {'kty': 'RSA', 'n': 'n', 'e': 'AQAB'},
+            rsa_key('one')
+        ]}
+        store = JWKSKeyStore(self.stub.url)
+
+        self.assertEqual(store.get('one'), rsa_key('one'))
+        for kid in ('ec', 'encryption', 'incomplete'):
+            self.assertEqual(store.get(kid), None)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()